@@ -1,12 +1,14 @@
 from fastapi import FastAPI, HTTPException, Query, File, UploadFile, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 import logging
 import os
+import orjson
 import yaml
 from typing import List, Dict, Optional, Union
-from search.engine import RAGQueryEngine
-from db import DatabaseConnection
+from search.engine import RAGQueryEngine, load_embedding_cache, save_embedding_cache
+from db import DatabaseConnection, get_pool
 import time
 from core.models import (
     SearchRequest, SearchResponse, SearchResult, Entity, 
@@ -58,6 +60,9 @@ async def startup_event():
         db = DatabaseConnection()
         db.connect()
         logger.info("Database connection established")
+        # Open pooled search connections now so the first query skips the handshakes
+        get_pool().warm_up()
+        load_embedding_cache()
     except Exception as e:
         logger.error(f"Failed to initialize database: {str(e)}")
         raise
@@ -69,6 +74,8 @@ async def shutdown_event():
     if db:
         db.disconnect()
         logger.info("Database connection closed")
+    get_pool().close()
+    save_embedding_cache()
 
 # CORS Configuration
 app.add_middleware(
@@ -212,8 +219,8 @@ async def search_documents(request: SearchRequest):
         start_time = time.time()
         rag_engine = RAGQueryEngine(debug_output=request.debug)
         
-        # Execute query
-        response = rag_engine.query(
+        # Execute query off the event loop so other requests keep being served
+        response = await rag_engine.aquery(
             query_text=request.query,
             top_k=request.top_k
         )
@@ -235,12 +242,33 @@ async def search_documents(request: SearchRequest):
         logger.error(f"Search error: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/kag-search/stream")
+async def stream_search_documents(request: SearchRequest):
+    """
+    Streaming variant of /kag-search returning newline-delimited JSON events:
+    the search results first, then response text as it is generated
+    """
+    start_time = time.time()
+    rag_engine = RAGQueryEngine(debug_output=request.debug)
+    
+    def events():
+        try:
+            for event in rag_engine.stream_query(request.query, request.top_k):
+                if event["type"] == "done":
+                    event["execution_time"] = time.time() - start_time
+                yield orjson.dumps(event) + b"\n"
+        except Exception as e:
+            logger.error(f"Streaming search error: {str(e)}", exc_info=True)
+            yield orjson.dumps({"type": "error", "detail": str(e)}) + b"\n"
+    
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
 @app.get("/kbdata", response_model=KBDataResponse)
 async def get_kb_data():
     """Get knowledge base statistics and document information."""
     start_time = time.time()
     try:
-        with DatabaseConnection() as conn:
+        with get_pool().acquire() as conn:
             # Get total document count and size
             doc_stats_query = """
                 SELECT 
@@ -360,7 +388,7 @@ async def get_graph_data():
     """Get knowledge graph visualization data."""
     start_time = time.time()
     try:
-        with DatabaseConnection() as conn:
+        with get_pool().acquire() as conn:
             # Get unique categories and assign group numbers
             category_query = """
                 SELECT DISTINCT category 
@@ -447,6 +475,10 @@ class ChunkingConfig(BaseModel):
     min_chunk_size: int = Field(ge=0)
     max_chunk_size: int = Field(ge=0)
 
+class EmbeddingConfig(BaseModel):
+    model: str
+    dimensions: int = Field(ge=1)
+
 class EntityExtractionConfig(BaseModel):
     model: str
     confidence_threshold: float = Field(ge=0.0, le=1.0)
@@ -466,20 +498,50 @@ class SearchConfig(BaseModel):
     min_score_threshold: float = Field(ge=0.0, le=1.0)
     min_similarity_score: float = Field(ge=0.0, le=1.0)
     context_window_size: int = Field(ge=0)
+    fusion: str = Field(default="linear", pattern="^(linear|combmnz)$")
+    vector_score_norm: str = Field(default="max", pattern="^(max|cosine)$")
+    max_search_terms: int = Field(default=32, ge=1)
+    lexical_max_tokens: int = Field(default=3, ge=0)
+    embedding_cache_size: int = Field(default=1024, ge=1)
+    embedding_cache_path: str = "cache/query_embeddings.json"
+    embedding_batching: bool = True
+    embedding_batch_size: int = Field(default=256, ge=1, le=2048)
+    embedding_batch_window_ms: float = Field(default=0, ge=0)
+    embedding_batch_timeout: float = Field(default=30, gt=0)
+    expansion_cache_size: int = Field(default=1024, ge=1)
+    semantic_cache_size: int = Field(default=256, ge=1)
+    semantic_cache_tau: float = Field(default=0.97, ge=0.0, le=1.0)
+    semantic_cache_ttl: int = Field(default=3600, ge=0)
+    entity_vocab_ttl: int = Field(default=300, ge=0)
+    query_cache_enabled: bool = True
+    query_cache_ttl_days: int = Field(default=7, ge=1)
+    result_cache_enabled: bool = True
+    result_cache_size: int = Field(default=512, ge=1)
+    result_cache_ttl: int = Field(default=300, ge=0)
+    result_cache_version_interval: float = Field(default=5, ge=0)
+    int8_prefilter: bool = False
+    int8_candidate_factor: int = Field(default=4, ge=1)
+    single_statement_search: bool = False
 
 class ResponseGenerationConfig(BaseModel):
     temperature: float = Field(ge=0.0, le=1.0)
     max_tokens: int = Field(ge=0)
     citation_style: str
     include_confidence: bool
+    min_confidence: float = Field(default=0.2, ge=0.0, le=1.0)
+    overlap_entity_lookup: bool = False
+    llm_cache_size: int = Field(default=512, ge=1)
+    llm_cache_ttl: int = Field(default=3600, ge=0)
     prompt_template: str
 
 class RetrievalConfig(BaseModel):
+    db_pool_size: int = Field(default=8, ge=1, le=32)
     search: SearchConfig
     response_generation: ResponseGenerationConfig
 
 class KnowledgeCreationConfig(BaseModel):
     chunking: ChunkingConfig
+    embedding: Optional[EmbeddingConfig] = None
     entity_extraction: EntityExtractionConfig
 
 class FullConfig(BaseModel):
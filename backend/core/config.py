@@ -34,6 +34,16 @@ class ConfigLoader:
         """Get retrieval settings."""
         return self._config['retrieval']
     
+    @property
+    def embedding_model(self) -> str:
+        """Get the embedding model used for documents and queries (EMBEDDING_MODEL overrides)."""
+        return os.getenv("EMBEDDING_MODEL") or (self.knowledge_creation.get('embedding') or {}).get('model', 'text-embedding-3-small')
+    
+    @property
+    def embedding_dims(self) -> int:
+        """Get the embedding dimensions (size of the VECTOR column, EMBEDDING_DIMS overrides)."""
+        return int(os.getenv("EMBEDDING_DIMS") or (self.knowledge_creation.get('embedding') or {}).get('dimensions', 512))
+    
     def get_chunking_rules(self) -> str:
         """Get formatted chunking rules for Gemini prompt."""
         rules = self.knowledge_creation['chunking']['semantic_rules']
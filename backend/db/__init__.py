@@ -1,3 +1,4 @@
-from .connection import DatabaseConnection
+from .connection import DatabaseConnection, ConnectionPool, get_pool
+from .vectors import normalize_l2, pack_float32, quantize_int8, quantize_int8_with_scale, backfill_int8_embeddings
 
-__all__ = ['DatabaseConnection']
\ No newline at end of file
+__all__ = ['DatabaseConnection', 'ConnectionPool', 'get_pool', 'normalize_l2', 'pack_float32', 'quantize_int8', 'quantize_int8_with_scale', 'backfill_int8_embeddings']
\ No newline at end of file
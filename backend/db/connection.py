@@ -2,9 +2,11 @@
 SingleStore database connection and operations module.
 """
 import os
-from typing import List, Dict, Any, Optional, Tuple
+import threading
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional, Tuple, Iterator
 import mysql.connector
-from mysql.connector import Error
+from mysql.connector import Error, pooling
 import numpy as np
 import json
 from datetime import datetime
@@ -34,10 +36,17 @@ DB_DATABASE = os.getenv("SINGLESTORE_DATABASE", "knowledge_graph")
 class DatabaseConnection:
     """Manages database connections and operations for SingleStore."""
     
-    def __init__(self):
-        """Initialize the database connection."""
+    def __init__(self, pool: Optional['ConnectionPool'] = None):
+        """
+        Initialize the database connection.
+        
+        Args:
+            pool: Optional ConnectionPool to check the connection out from instead
+                of opening a new one
+        """
         self.conn = None
         self.cursor = None
+        self.pool = pool
         
     def connect(self) -> None:
         """
@@ -57,6 +66,12 @@ class DatabaseConnection:
             )
         
         try:
+            if self.pool is not None:
+                self.conn = self.pool.get_connection()
+                self.cursor = self.conn.cursor(buffered=True)
+                logger.debug("Checked out pooled SingleStore connection")
+                return
+            
             self.conn = mysql.connector.connect(
                 host=DB_HOST,
                 port=DB_PORT,
@@ -80,12 +95,24 @@ class DatabaseConnection:
                 pass
             self.cursor = None
         if self.conn:
+            if self.pool is not None:
+                try:
+                    # Sessions are not reset on return, so never hand an open
+                    # transaction (e.g. left by an exception) to the next borrower
+                    if self.conn.in_transaction:
+                        self.conn.rollback()
+                except Exception:
+                    pass
             try:
+                # For pooled connections close() returns the connection to the pool
                 self.conn.close()
             except Exception:
                 pass
             self.conn = None
-            logger.info("Database connection closed")
+            if self.pool is not None:
+                logger.debug("Pooled database connection released")
+            else:
+                logger.info("Database connection closed")
 
     def execute_query(self, query: str, params: Optional[tuple] = None) -> Optional[List[Tuple[Any, ...]]]:
         """
@@ -107,8 +134,8 @@ class DatabaseConnection:
             
             self.cursor.execute(query, params)
             
-            # For SELECT queries, return results
-            if query.strip().upper().startswith('SELECT'):
+            # For queries that produce a result set (SELECT, WITH ..., parenthesized UNIONs), return results
+            if self.cursor.with_rows:
                 return self.cursor.fetchall()
             
             # For non-SELECT queries, commit the transaction
@@ -167,12 +194,14 @@ class DatabaseConnection:
         try:
             # Create Document_Embeddings table
             if not self.table_exists("Document_Embeddings"):
-                create_embeddings_table = """
+                create_embeddings_table = f"""
                 CREATE TABLE Document_Embeddings (
                     embedding_id BIGINT PRIMARY KEY AUTO_INCREMENT,
                     doc_id BIGINT NOT NULL,
                     content TEXT,
-                    embedding VECTOR(1536)
+                    embedding VECTOR({config.embedding_dims}),
+                    embedding_i8 VECTOR({config.embedding_dims}, I8),
+                    embedding_i8_scale FLOAT
                 )
                 """
                 self.execute_query(create_embeddings_table)
@@ -245,6 +274,39 @@ class DatabaseConnection:
                 self.execute_query(create_entities)
                 logger.info("Created Entities table")
                 
+            # Create Query_Cache table (shared response cache for search queries)
+            if not self.table_exists("Query_Cache"):
+                create_query_cache = f"""
+                CREATE TABLE Query_Cache (
+                    query_hash BINARY(32) NOT NULL,
+                    model VARCHAR(100) NOT NULL,
+                    top_k INT NOT NULL,
+                    embedding VECTOR({config.embedding_dims}),
+                    response JSON,
+                    hit_count BIGINT DEFAULT 0,
+                    corpus_version VARCHAR(64),
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    last_used TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (query_hash),
+                    SHARD KEY (query_hash)
+                )
+                """
+                self.execute_query(create_query_cache)
+                logger.info("Created Query_Cache table")
+                
+            # Create Chunk_Entities table (entities extracted from each chunk)
+            if not self.table_exists("Chunk_Entities"):
+                create_chunk_entities = """
+                CREATE TABLE Chunk_Entities (
+                    embedding_id BIGINT NOT NULL,
+                    entity_id BIGINT NOT NULL,
+                    PRIMARY KEY (embedding_id, entity_id),
+                    SHARD KEY (embedding_id)
+                )
+                """
+                self.execute_query(create_chunk_entities)
+                logger.info("Created Chunk_Entities table")
+                
         except Exception as e:
             logger.error("Failed to create tables: %s", str(e))
             raise
@@ -267,6 +329,87 @@ class DatabaseConnection:
         self.disconnect()
 
 
+class ConnectionPool:
+    """Bounded pool of SingleStore connections shared across requests."""
+    
+    def __init__(self, size: int = 8):
+        """
+        Initialize the pool. Connections are opened lazily on first use.
+        
+        Args:
+            size: Maximum number of open connections (the driver caps this at 32)
+        """
+        self.size = size
+        self._pool = None
+        self._lock = threading.Lock()
+        # The driver raises instead of blocking when exhausted, so gate checkouts
+        self._slots = threading.BoundedSemaphore(size)
+    
+    def get_connection(self):
+        """Get a live connection from the underlying driver pool."""
+        with self._lock:
+            if self._pool is None:
+                self._pool = pooling.MySQLConnectionPool(
+                    pool_name="singlestore_kag",
+                    pool_size=self.size,
+                    pool_reset_session=False,  # Session variables are always set before use
+                    host=DB_HOST,
+                    port=DB_PORT,
+                    user=DB_USER,
+                    password=DB_PASSWORD,
+                    database=DB_DATABASE
+                )
+                logger.info(f"Created SingleStore connection pool (size={self.size})")
+        return self._pool.get_connection()
+    
+    @contextmanager
+    def acquire(self) -> Iterator[DatabaseConnection]:
+        """
+        Check out a DatabaseConnection for the duration of a with-block.
+        
+        Yields:
+            DatabaseConnection backed by a pooled connection
+        """
+        self._slots.acquire()
+        try:
+            with DatabaseConnection(pool=self) as db:
+                yield db
+        finally:
+            self._slots.release()
+    
+    def warm_up(self) -> None:
+        """Open the pool's connections up front and verify one with SELECT 1."""
+        with self.acquire() as db:
+            db.execute_query("SELECT 1")
+        logger.info("SingleStore connection pool warmed up")
+    
+    def close(self) -> None:
+        """Close all idle pooled connections."""
+        with self._lock:
+            if self._pool is not None:
+                self._pool._remove_connections()
+                self._pool = None
+                logger.info("SingleStore connection pool closed")
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """
+    Get the process-wide connection pool, sized from retrieval.db_pool_size.
+    
+    Returns:
+        Shared ConnectionPool instance
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool(size=config.retrieval.get('db_pool_size', 8))
+        return _pool
+
+
 def test_connection():
     """
     Test the database connection and run a simple query.
@@ -2,7 +2,9 @@ CREATE TABLE Document_Embeddings (
   embedding_id BIGINT PRIMARY KEY AUTO_INCREMENT,
   doc_id       BIGINT NOT NULL,
   content      TEXT,
-  embedding    VECTOR(1536),
+  embedding    VECTOR(512),  -- knowledge_creation.embedding.dimensions
+  embedding_i8 VECTOR(512, I8),  -- int8 copy for the vector search prefilter (search.int8_prefilter)
+  embedding_i8_scale FLOAT,      -- per-row dequantization scale: max |component| / 127
   chunk_metadata_id BIGINT,
   SORT KEY(),  -- Ensure this is a columnstore table&#8203;:contentReference[oaicite:11]{index=11}
   FULLTEXT USING VERSION 2 content_ft_idx (content),  -- Full-Text index (v2) on content&#8203;:contentReference[oaicite:12]{index=12}
@@ -137,4 +139,57 @@ DROP INDEX embedding_vec_idx ON Document_Embeddings;
 -- Recreate the vector index with supported index options only
    ALTER TABLE Document_Embeddings 
    ADD VECTOR INDEX embedding_vec_idx (embedding)
-   INDEX_OPTIONS '{"index_type": "HNSW_FLAT", "metric_type": "DOT_PRODUCT", "M": 32, "efConstruction": 200}';
\ No newline at end of file
+   INDEX_OPTIONS '{"index_type": "HNSW_FLAT", "metric_type": "DOT_PRODUCT", "M": 32, "efConstruction": 200}';
+
+----- Shared query cache (responses reused across API processes and restarts)
+CREATE TABLE Query_Cache (
+    query_hash BINARY(32) NOT NULL,      -- sha256(model, top_k, normalized query)
+    model VARCHAR(100) NOT NULL,
+    top_k INT NOT NULL,
+    embedding VECTOR(512),               -- Enhanced-query embedding for similarity lookups
+    response JSON,                       -- Serialized SearchResponse
+    hit_count BIGINT DEFAULT 0,
+    corpus_version VARCHAR(64),          -- Document_Embeddings "row count:max embedding_id" at write time
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,  -- entries expire query_cache_ttl_days after this
+    last_used TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (query_hash),
+    SHARD KEY (query_hash)
+);
+
+
+----- Entities extracted from each chunk, written at ingest so search can
+-- fetch a result's entities by key instead of matching terms per query.
+-- Link chunks ingested earlier with search.backfill_chunk_entities().
+CREATE TABLE Chunk_Entities (
+    embedding_id BIGINT NOT NULL,        -- Document_Embeddings.embedding_id
+    entity_id BIGINT NOT NULL,
+    PRIMARY KEY (embedding_id, entity_id),
+    SHARD KEY (embedding_id)
+);
+
+
+----- Upgrades for databases created before the definitions above
+-- Not part of a new install: the CREATE TABLE statements above already include
+-- these changes. Run only the statements an existing database is missing.
+
+-- Query_Cache.corpus_version: rows written before it never match and age out
+ALTER TABLE Query_Cache ADD COLUMN corpus_version VARCHAR(64);
+
+-- Embedding model migration: text-embedding-3-small @ 512 dimensions, for
+-- databases whose Document_Embeddings.embedding is still VECTOR(1536). Query
+-- embeddings use knowledge_creation.embedding in config.yaml, so the column size
+-- must match embedding.dimensions. Existing rows must be re-embedded offline
+-- (re-run ingestion for each document) after the column is recreated.
+DROP INDEX embedding_vec_idx ON Document_Embeddings;
+ALTER TABLE Document_Embeddings DROP COLUMN embedding;
+ALTER TABLE Document_Embeddings ADD COLUMN embedding VECTOR(512);
+ALTER TABLE Document_Embeddings
+   ADD VECTOR INDEX embedding_vec_idx (embedding)
+   INDEX_OPTIONS '{"index_type": "HNSW_FLAT", "metric_type": "DOT_PRODUCT", "M": 32, "efConstruction": 200}';
+
+-- int8 copy of document embeddings for the vector search prefilter. The prefilter
+-- ranks by (embedding_i8 <*> query) * embedding_i8_scale and skips rows without a
+-- scale, so backfill existing rows with db.backfill_int8_embeddings() before
+-- setting retrieval.search.int8_prefilter: true in config.yaml.
+ALTER TABLE Document_Embeddings ADD COLUMN embedding_i8 VECTOR(512, I8);
+ALTER TABLE Document_Embeddings ADD COLUMN embedding_i8_scale FLOAT;
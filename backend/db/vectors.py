@@ -0,0 +1,88 @@
+"""
+Vector encoding helpers for SingleStore VECTOR columns.
+"""
+import logging
+from typing import Sequence, Tuple
+
+import numpy as np
+import orjson
+
+from core.config import config
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_l2(embedding: Sequence[float]) -> np.ndarray:
+    """
+    Scale an embedding to unit length as a float32 array.
+
+    With both stored and query embeddings normalized, the `<*>` dot product is
+    their cosine similarity. Zero vectors are returned unchanged.
+    """
+    vec = np.asarray(embedding, dtype=np.float32)
+    norm = float(np.linalg.norm(vec))
+    return vec / norm if norm else vec
+
+
+def pack_float32(embedding: Sequence[float]) -> bytes:
+    """Pack an embedding as little-endian float32 bytes for a `%s :> VECTOR(n, F32)` bind."""
+    return np.asarray(embedding, dtype='<f4').tobytes()
+
+
+def quantize_int8_with_scale(embedding: Sequence[float]) -> Tuple[bytes, float]:
+    """
+    Quantize an embedding to packed int8 bytes and return its dequantization scale.
+
+    Each vector is scaled by its own max absolute component so the full
+    [-127, 127] range is used; multiplying the int8 values by the returned
+    scale recovers the original magnitudes.
+
+    Returns:
+        (packed int8 bytes for a VECTOR(n, I8) column, scale)
+    """
+    vec = np.asarray(embedding, dtype=np.float32)
+    max_abs = float(np.max(np.abs(vec))) if vec.size else 0.0
+    if max_abs:
+        vec = vec * (127.0 / max_abs)
+    packed = np.clip(np.round(vec), -127, 127).astype(np.int8).tobytes()
+    return packed, (max_abs / 127.0 if max_abs else 1.0)
+
+
+def quantize_int8(embedding: Sequence[float]) -> bytes:
+    """Quantize an embedding to packed int8 bytes for a VECTOR(n, I8) column."""
+    return quantize_int8_with_scale(embedding)[0]
+
+
+def backfill_int8_embeddings(db, batch_size: int = 500) -> int:
+    """
+    Populate Document_Embeddings.embedding_i8 and its scale for rows that do not have them yet.
+
+    Args:
+        db: Open DatabaseConnection
+        batch_size: Rows quantized per round-trip
+
+    Returns:
+        Number of rows updated
+    """
+    updated = 0
+    while True:
+        rows = db.execute_query(
+            """
+            SELECT embedding_id, embedding FROM Document_Embeddings
+            WHERE (embedding_i8 IS NULL OR embedding_i8_scale IS NULL) AND embedding IS NOT NULL
+            LIMIT %s
+            """,
+            (batch_size,)
+        )
+        if not rows:
+            break
+        for embedding_id, embedding in rows:
+            packed, scale = quantize_int8_with_scale(orjson.loads(embedding))
+            db.execute_query(
+                f"UPDATE Document_Embeddings SET embedding_i8 = %s :> VECTOR({config.embedding_dims}, I8), "
+                "embedding_i8_scale = %s WHERE embedding_id = %s",
+                (packed, scale, embedding_id)
+            )
+        updated += len(rows)
+        logger.info(f"Quantized {updated} document embeddings")
+    return updated
@@ -3,8 +3,8 @@ import sys
 import argparse
 import logging
 import json
-import numpy as np
-from db import DatabaseConnection
+from db import DatabaseConnection, normalize_l2, pack_float32, quantize_int8_with_scale
+from core.config import config
 
 import requests
 from openai import Client as OpenAIClient
@@ -28,7 +28,7 @@ class DocumentProcessor:
         self.gemini_api_key = os.getenv("GEMINI_API_KEY")
         self.openai_api_key = os.getenv("OPENAI_API_KEY")
         self.project_id = os.getenv("PROJECT_ID")
-        self.embedding_model = os.getenv("EMBEDDING_MODEL", "text-embedding-ada-002")
+        self.embedding_model = config.embedding_model
         
         # Validate environment variables
         self._validate_env_vars()
@@ -143,22 +143,23 @@ class DocumentProcessor:
                 # Generate embedding using the OpenAI client (1.0.0+ syntax)
                 response = self.openai_client.Embeddings.create(
                     input=chunk,
-                    model=self.embedding_model
+                    model=self.embedding_model,
+                    dimensions=config.embedding_dims
                 )
                 embedding_vector = response.data[0].embedding  # list of floats
             except Exception as e:
                 logging.error(f"Embedding generation failed for chunk {idx}: {e}")
                 continue
 
-            # Convert to float32 numpy array for SingleStore compatibility
-            embedding_array = np.array(embedding_vector, dtype=np.float32)
+            # Convert to a unit-length float32 array so dot product equals cosine
+            embedding_array = normalize_l2(embedding_vector)
             # Verify the embedding has correct dimensions
-            expected_dims = 1536  # text-embedding-ada-002 always produces 1536 dimensions
+            expected_dims = config.embedding_dims  # Must match the VECTOR(n) column size
             if len(embedding_array) != expected_dims:
                 logger.error(
-                    "Embedding dimension mismatch: got %d dimensions, schema expects 1536. "
-                    "The text-embedding-ada-002 model should always produce 1536 dimensions.", 
-                    len(embedding_array)
+                    "Embedding dimension mismatch: got %d dimensions, schema expects %d. "
+                    "Check the embedding model and dimensions in config.yaml.", 
+                    len(embedding_array), expected_dims
                 )
                 raise ValueError("Embedding dimension mismatch")
             
@@ -209,10 +210,11 @@ class DocumentProcessor:
                 logger.debug("Ensured document_id %d exists in Documents table", document_id)
                 
                 # Insert embeddings
-                insert_query = """
+                insert_query = f"""
                 INSERT INTO Document_Embeddings 
-                (doc_id, content, embedding) 
-                VALUES (%s, %s, %s)
+                (doc_id, content, embedding, embedding_i8, embedding_i8_scale) 
+                VALUES (%s, %s, %s :> VECTOR({config.embedding_dims}, F32),
+                        %s :> VECTOR({config.embedding_dims}, I8), %s)
                 """
                 
                 logger.debug("Using insert query template: %s", insert_query)
@@ -222,26 +224,30 @@ class DocumentProcessor:
                     embedding = item['embedding']  # This is already a list of floats
                     
                     # Verify embedding dimensions match schema
-                    if len(embedding) != 1536:
+                    if len(embedding) != config.embedding_dims:
                         logger.error(
-                            "Embedding dimension mismatch: got %d dimensions, schema expects 1536. "
+                            "Embedding dimension mismatch: got %d dimensions, schema expects %d. "
                             "Update schema.sql to match your embedding model's dimensions.", 
-                            len(embedding)
+                            len(embedding), config.embedding_dims
                         )
                         raise ValueError("Embedding dimension mismatch")
                     
-                    # Convert embedding to JSON array string for SingleStore VECTOR type
-                    embedding_json = json.dumps(embedding)
-                    
                     # Log query details for debugging
-                    debug_query = insert_query % (
-                        document_id,
-                        repr(chunk[:50] + "..." if len(chunk) > 50 else chunk),
-                        repr(embedding_json)
-                    )
-                    logger.debug("Executing query: %s", debug_query)
+                    if logger.isEnabledFor(logging.DEBUG):
+                        debug_query = insert_query % (
+                            document_id,
+                            repr(chunk[:50] + "..." if len(chunk) > 50 else chunk),
+                            "<f32>",
+                            "<int8>",
+                            "<scale>"
+                        )
+                        logger.debug("Executing query: %s", debug_query)
                     
-                    db.execute_query(insert_query, (document_id, chunk, embedding_json))
+                    # Bind the vector as packed float32 bytes rather than a JSON array string
+                    db.execute_query(
+                        insert_query,
+                        (document_id, chunk, pack_float32(embedding), *quantize_int8_with_scale(embedding))
+                    )
                 
                 logger.info("Successfully inserted %d chunks for document_id %d", len(data), document_id)
         
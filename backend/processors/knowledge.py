@@ -13,6 +13,7 @@ import re
 from datetime import datetime
 from dotenv import load_dotenv
 from openai import OpenAI
+import orjson
 
 from db import DatabaseConnection
 from core.config import config
@@ -303,13 +304,15 @@ class KnowledgeGraphGenerator:
         except Exception as e:
             logger.warning(f"Failed to save debug output: {str(e)}")
     
-    def store_knowledge(self, knowledge: Dict, db: DatabaseConnection) -> None:
+    def store_knowledge(self, knowledge: Dict, db: DatabaseConnection, chunk_id: Optional[int] = None) -> None:
         """
         Store extracted knowledge in SingleStore.
         
         Args:
             knowledge: Dict containing entities and relationships
             db: Database connection instance
+            chunk_id: embedding_id of the source chunk; when given, the chunk's
+                entities are recorded in Chunk_Entities
         """
         try:
             # Start transaction
@@ -344,7 +347,7 @@ class KnowledgeGraphGenerator:
                             "entity_id": existing[0][0],
                             "name": existing[0][1],
                             "description": existing[0][2],
-                            "aliases": existing[0][3] if isinstance(existing[0][3], list) else json.loads(existing[0][3]) if existing[0][3] else [],
+                            "aliases": existing[0][3] if isinstance(existing[0][3], list) else orjson.loads(existing[0][3]) if existing[0][3] else [],
                             "category": existing[0][4]
                         }
                         merged = self.merge_entity_info(existing_entity, entity)
@@ -384,6 +387,18 @@ class KnowledgeGraphGenerator:
                         )
                         logger.info(f"Inserted new entity: {entity['name']}")
                 
+                # Link the chunk to its entities for search-time lookup
+                if chunk_id is not None and unique_entities:
+                    names = list(unique_entities)
+                    db.execute_query(
+                        f"""
+                        INSERT IGNORE INTO Chunk_Entities (embedding_id, entity_id)
+                        SELECT %s, entity_id FROM Entities
+                        WHERE name IN ({', '.join(['%s'] * len(names))})
+                        """,
+                        (chunk_id, *names)
+                    )
+                
                 # Store relationships
                 for rel in knowledge["relationships"]:
                     insert_rel_query = """
@@ -451,7 +466,7 @@ class KnowledgeGraphGenerator:
                     self.save_debug_output(knowledge, doc_id, chunk_id)
                     
                     # Store knowledge
-                    self.store_knowledge(knowledge, db)
+                    self.store_knowledge(knowledge, db, chunk_id)
                     
                 logger.info(f"Successfully processed document {doc_id}")
                 
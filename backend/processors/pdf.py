@@ -9,7 +9,7 @@ from processors.knowledge import KnowledgeGraphGenerator
 import google.generativeai as genai
 from google.generativeai.types import GenerateContentResponse
 
-from db import DatabaseConnection
+from db import DatabaseConnection, normalize_l2, pack_float32, quantize_int8_with_scale
 from core.config import config
 from core.models import Document, DocumentChunk
 
@@ -479,19 +479,22 @@ def process_pdf(doc_id: int, task=None):
                 # Get embedding for chunk content
                 client = OpenAI()
                 response = client.embeddings.create(
-                    model="text-embedding-ada-002",
-                    input=chunk["content"]
+                    model=config.embedding_model,
+                    input=chunk["content"],
+                    dimensions=config.embedding_dims
                 )
-                embedding = response.data[0].embedding
+                embedding = normalize_l2(response.data[0].embedding)
                 
                 # Store chunk and embedding
                 conn.execute_query(
-                    """
-                    INSERT INTO Document_Embeddings (doc_id, content, embedding) 
-                    VALUES (%s, %s, JSON_ARRAY_PACK(%s))
+                    f"""
+                    INSERT INTO Document_Embeddings (doc_id, content, embedding, embedding_i8, embedding_i8_scale) 
+                    VALUES (%s, %s, %s :> VECTOR({config.embedding_dims}, F32),
+                            %s :> VECTOR({config.embedding_dims}, I8), %s)
                     """,
-                    (doc_id, chunk['content'], json.dumps(embedding))
+                    (doc_id, chunk['content'], pack_float32(embedding), *quantize_int8_with_scale(embedding))
                 )
+                chunk['embedding_id'] = conn.execute_query("SELECT LAST_INSERT_ID()")[0][0]
             
             # Extract and store knowledge
             kg = KnowledgeGraphGenerator(debug_output=True)
@@ -501,7 +504,7 @@ def process_pdf(doc_id: int, task=None):
                 try:
                     knowledge = kg.extract_knowledge_sync(chunk_text)
                     if knowledge:
-                        kg.store_knowledge(knowledge, conn)
+                        kg.store_knowledge(knowledge, conn, chunk.get('embedding_id'))
                 except Exception as e:
                     logger.error(f"Error processing chunk {i}: {str(e)}")
                     logger.debug(f"Problematic chunk content: {repr(chunk_text)}")
@@ -1,3 +1,3 @@
-from .engine import RAGQueryEngine
+from .engine import RAGQueryEngine, backfill_chunk_entities
 
-__all__ = ['RAGQueryEngine']
\ No newline at end of file
+__all__ = ['RAGQueryEngine', 'backfill_chunk_entities']
\ No newline at end of file
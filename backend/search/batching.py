@@ -0,0 +1,124 @@
+"""
+Request coalescing for the embeddings API.
+
+EmbeddingBatcher collects texts submitted from concurrent queries and sends them
+to the embeddings endpoint in one call. A single worker thread keeps at most one
+request in flight: texts submitted while it is waiting on the API are sent
+together in the next call, so batches grow with load without delaying an idle
+caller. An optional max_delay holds each batch open a little longer.
+
+If a batched call fails, its texts are retried one at a time so a single bad
+input only fails its own caller, and callers stop waiting after a timeout.
+"""
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingBatcher:
+    """Coalesces concurrent embedding requests into batched API calls."""
+
+    def __init__(
+        self,
+        embed_fn: Callable[[List[str]], List[Sequence[float]]],
+        max_batch: int = 256,
+        max_delay: float = 0.0,
+        timeout: Optional[float] = 30.0
+    ):
+        """
+        Initialize the batcher and start its worker thread.
+
+        Args:
+            embed_fn: Embeds a list of texts, returning embeddings in the same order
+            max_batch: Maximum texts per API call
+            max_delay: Seconds to wait for more texts after the first one arrives
+            timeout: Seconds embed() waits for its texts (None waits indefinitely)
+        """
+        self.embed_fn = embed_fn
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self._queue: "queue.Queue[Tuple[str, Future]]" = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, text: str) -> Future:
+        """Queue a text for embedding; the returned future resolves to its embedding."""
+        future: Future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def embed(self, texts: List[str]) -> List[Sequence[float]]:
+        """
+        Embed texts through the shared batches, blocking until all are done.
+
+        Raises:
+            concurrent.futures.TimeoutError: If the texts are not embedded within the timeout
+        """
+        futures = [self.submit(text) for text in texts]
+        if self.timeout is None:
+            return [future.result() for future in futures]
+        deadline = time.monotonic() + self.timeout
+        return [future.result(timeout=max(deadline - time.monotonic(), 0)) for future in futures]
+
+    def _collect(self) -> List[Tuple[str, Future]]:
+        """Block for the first pending text, then take whatever else is queued."""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            try:
+                remaining = deadline - time.monotonic()
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _embed_texts(self, texts: List[str]) -> Dict[str, Sequence[float]]:
+        """Call embed_fn and map each text to its embedding, checking one came back per text."""
+        embeddings = self.embed_fn(texts)
+        if len(embeddings) != len(texts):
+            raise ValueError(f"Embedding call returned {len(embeddings)} embeddings for {len(texts)} texts")
+        return dict(zip(texts, embeddings))
+
+    def _resolve(self, batch: List[Tuple[str, Future]]) -> None:
+        """Embed a batch and resolve its futures, retrying texts one at a time if the batched call fails."""
+        texts = list(dict.fromkeys(text for text, _ in batch))
+        errors: Dict[str, Exception] = {}
+        try:
+            embeddings = self._embed_texts(texts)
+        except Exception as e:
+            if len(texts) == 1:
+                raise
+            logger.warning(f"Batched embedding of {len(texts)} texts failed, retrying individually: {str(e)}")
+            embeddings = {}
+            for text in texts:
+                try:
+                    embeddings.update(self._embed_texts([text]))
+                except Exception as text_error:
+                    errors[text] = text_error
+        else:
+            if len(batch) > 1:
+                logger.debug(f"Embedded {len(texts)} texts for {len(batch)} requests in one call")
+        for text, future in batch:
+            if text in errors:
+                future.set_exception(errors[text])
+            else:
+                future.set_result(embeddings[text])
+
+    def _run(self) -> None:
+        """Worker loop: send each collected batch and resolve its futures."""
+        while True:
+            batch = self._collect()
+            try:
+                self._resolve(batch)
+            except Exception as e:
+                # The worker must outlive any failure, and no caller may be left waiting
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
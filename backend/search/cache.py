@@ -0,0 +1,202 @@
+"""
+Query caches for the RAG query engine.
+
+SemanticQueryCache is an in-process cache keyed by L2-normalized embeddings. A
+lookup returns the value of the most similar cached entry when its cosine
+similarity clears a threshold, so near-duplicate queries can reuse earlier results.
+
+QueryCacheStore persists responses in the SingleStore Query_Cache table so they
+survive restarts and are shared across worker processes. Each row records the
+Document_Embeddings version it was generated against and only matches while
+that version is current.
+"""
+
+import hashlib
+import logging
+import threading
+import time
+from typing import Any, Dict, Hashable, List, Optional, Sequence
+
+import numpy as np
+
+from db import DatabaseConnection, normalize_l2, pack_float32
+
+logger = logging.getLogger(__name__)
+
+
+class SemanticQueryCache:
+    """Fixed-capacity FIFO cache keyed by embedding cosine similarity."""
+
+    def __init__(self, dims: int, capacity: int = 256, threshold: float = 0.97, ttl: Optional[float] = None):
+        """
+        Initialize the cache.
+
+        Args:
+            dims: Embedding dimensions
+            capacity: Maximum number of entries before the oldest is evicted
+            threshold: Minimum cosine similarity for a lookup to hit
+            ttl: Seconds an entry can be matched after it is added (None keeps entries until evicted)
+        """
+        self.dims = dims
+        self.capacity = capacity
+        self.threshold = threshold
+        self.ttl = ttl
+        self._matrix = np.zeros((capacity, dims), dtype=np.float32)
+        self._values: List[Any] = [None] * capacity
+        # Keys are interned to small ints so key filtering is one array comparison;
+        # codes of keys with no live entry are dropped once the index outgrows the cache
+        self._key_codes = np.full(capacity, -1, dtype=np.int32)
+        self._key_index: Dict[Hashable, int] = {None: -1}
+        self._next_code = 0
+        self._added_at = np.zeros(capacity, dtype=np.float64)
+        self._size = 0
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def lookup(self, embedding: Sequence[float], key: Optional[Hashable] = None) -> Optional[Any]:
+        """
+        Find the cached value for the most similar embedding.
+
+        Args:
+            embedding: Query embedding
+            key: If given, only entries stored with the same key can match
+
+        Returns:
+            Cached value, or None if no entry is similar enough
+        """
+        query = normalize_l2(embedding)
+        with self._lock:
+            if self._size == 0:
+                return None
+            scores = self._matrix[:self._size] @ query
+            if key is not None:
+                code = self._key_index.get(key)
+                if code is None:
+                    return None
+                scores[self._key_codes[:self._size] != code] = -np.inf
+            if self.ttl is not None:
+                scores[self._added_at[:self._size] < time.monotonic() - self.ttl] = -np.inf
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                return None
+            return self._values[best]
+
+    def add(self, embedding: Sequence[float], value: Any, key: Optional[Hashable] = None) -> None:
+        """
+        Store a value, evicting the oldest entry when the cache is full.
+
+        Args:
+            embedding: Query embedding the value was computed for
+            value: Value to cache
+            key: Optional key that lookups must match
+        """
+        vec = normalize_l2(embedding)
+        with self._lock:
+            slot = self._next
+            self._matrix[slot] = vec
+            self._values[slot] = value
+            code = self._key_index.get(key)
+            if code is None:
+                code = self._key_index[key] = self._next_code
+                self._next_code += 1
+            self._key_codes[slot] = code
+            self._added_at[slot] = time.monotonic()
+            self._next = (slot + 1) % self.capacity
+            self._size = min(self._size + 1, self.capacity)
+            if len(self._key_index) > self.capacity + 1:
+                live = set(self._key_codes[:self._size].tolist())
+                self._key_index = {k: c for k, c in self._key_index.items() if k is None or c in live}
+
+
+class QueryCacheStore:
+    """Persistent response cache backed by the SingleStore Query_Cache table."""
+
+    def __init__(self, dims: int, ttl_days: int = 7):
+        """
+        Initialize the store.
+
+        Args:
+            dims: Embedding dimensions of the Query_Cache.embedding column
+            ttl_days: Entries older than this many days are ignored and evicted; hits do not extend them
+        """
+        self.dims = dims
+        self.ttl_days = ttl_days
+
+    @staticmethod
+    def make_key(model: str, query: str, top_k: int) -> bytes:
+        """Hash the whitespace/case-normalized query together with the model and top_k."""
+        normalized = ' '.join(query.lower().split())
+        return hashlib.sha256(f"{model}\x00{top_k}\x00{normalized}".encode()).digest()
+
+    def get(self, db: DatabaseConnection, key: bytes, corpus_version: str) -> Optional[str]:
+        """
+        Look up a cached response by exact query key and record the hit.
+
+        Args:
+            key: Key from make_key
+            corpus_version: Current Document_Embeddings version; entries written for another version miss
+
+        Returns:
+            Cached response JSON, or None on a miss
+        """
+        rows = db.execute_query(
+            """
+            SELECT response FROM Query_Cache
+            WHERE query_hash = %s AND corpus_version = %s AND created_at > NOW() - INTERVAL %s DAY
+            """,
+            (key, corpus_version, self.ttl_days)
+        )
+        if not rows:
+            return None
+        db.execute_query(
+            "UPDATE Query_Cache SET hit_count = hit_count + 1, last_used = NOW() WHERE query_hash = %s",
+            (key,)
+        )
+        return rows[0][0]
+
+    def get_similar(self, db: DatabaseConnection, embedding: Sequence[float], model: str, top_k: int,
+                    threshold: float, corpus_version: str) -> Optional[str]:
+        """
+        Look up the cached response whose query embedding is most similar.
+
+        Only entries for the same model, top_k and corpus_version are considered.
+
+        Returns:
+            Cached response JSON, or None if nothing clears the threshold
+        """
+        rows = db.execute_query(
+            f"""
+            SELECT response, (embedding <*> (%s :> VECTOR({self.dims}, F32))) AS similarity
+            FROM Query_Cache
+            WHERE model = %s AND top_k = %s AND corpus_version = %s
+              AND created_at > NOW() - INTERVAL %s DAY
+            ORDER BY similarity DESC
+            LIMIT 1
+            """,
+            (pack_float32(embedding), model, top_k, corpus_version, self.ttl_days)
+        )
+        if not rows or rows[0][1] is None or rows[0][1] < threshold:
+            return None
+        return rows[0][0]
+
+    def put(self, db: DatabaseConnection, key: bytes, model: str, top_k: int,
+            embedding: Optional[Sequence[float]], response_json: str, corpus_version: str) -> None:
+        """Insert or replace a cached response (embedding may be None for text-only queries)."""
+        embedding_param = None if embedding is None else pack_float32(embedding)
+        db.execute_query(
+            f"""
+            INSERT INTO Query_Cache (query_hash, model, top_k, embedding, response, corpus_version)
+            VALUES (%s, %s, %s, %s :> VECTOR({self.dims}, F32), %s, %s)
+            ON DUPLICATE KEY UPDATE response = VALUES(response), corpus_version = VALUES(corpus_version),
+                                    created_at = NOW(), last_used = NOW()
+            """,
+            (key, model, top_k, embedding_param, response_json, corpus_version)
+        )
+
+    def evict(self, db: DatabaseConnection) -> None:
+        """Delete entries written more than ttl_days ago."""
+        db.execute_query(
+            "DELETE FROM Query_Cache WHERE created_at < NOW() - INTERVAL %s DAY",
+            (self.ttl_days,)
+        )
+        logger.info("Evicted stale Query_Cache entries")
@@ -8,16 +8,28 @@ This module implements a hybrid search system that combines:
 to answer natural language queries with citations.
 """
 
+import asyncio
+import base64
+import hashlib
+import heapq
 import os
 import logging
-import json
+import queue
+import string
+import threading
 import time
-from typing import Dict, List, Any, Optional
-from openai import OpenAI
-from dotenv import load_dotenv
-from db import DatabaseConnection
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from operator import itemgetter
+import numpy as np
+import orjson
+from cachetools import LRUCache, TTLCache
+from typing import Callable, Dict, Iterator, List, Any, FrozenSet, Optional, Tuple
+from db import DatabaseConnection, get_pool, normalize_l2, pack_float32, quantize_int8
 from core.models import Entity, Relationship, SearchResult, SearchResponse
 from core.config import config
+from .batching import EmbeddingBatcher
+from .cache import SemanticQueryCache, QueryCacheStore
 import re
 import datetime
 
@@ -29,6 +41,324 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Returned instead of an LLM answer when retrieval finds nothing relevant
+NO_RESULTS_RESPONSE = "I could not find relevant information in the knowledge base to answer your query."
+
+
+class _StreamCancelled(Exception):
+    """Raised from streaming callbacks to abort a query whose consumer has gone away."""
+
+# Entity term extraction splits on anything but word characters and whitespace. ASCII
+# content takes a translation table built from the same regex; other text uses the
+# regex so non-ASCII punctuation (curly quotes, dashes) still separates words
+_TERM_CLEAN_RE = re.compile(r'[^\w\s]')
+_PUNCT_TABLE = str.maketrans({chr(c): ' ' for c in range(128) if _TERM_CLEAN_RE.match(chr(c))})
+
+# Common words that are never looked up as entity names
+_STOPWORDS = frozenset({
+    'the', 'and', 'for', 'are', 'but', 'not', 'you', 'all', 'any', 'can', 'had',
+    'her', 'was', 'one', 'our', 'out', 'has', 'his', 'how', 'its', 'may', 'new',
+    'now', 'who', 'did', 'get', 'use', 'via', 'also', 'been', 'from', 'have',
+    'into', 'more', 'most', 'such', 'than', 'that', 'them', 'then', 'they',
+    'this', 'were', 'what', 'when', 'which', 'while', 'will', 'with', 'your',
+    'about', 'there', 'their', 'these', 'those', 'would', 'could', 'should'
+})
+
+# Values accepted by Entity.category's pattern; rows outside it are skipped
+_ENTITY_CATEGORIES = frozenset({
+    'PERSON', 'ORGANIZATION', 'LOCATION', 'TECHNOLOGY', 'CONCEPT', 'EVENT', 'PRODUCT'
+})
+
+# Leading words that mark a short query as a question or instruction rather than a name
+_QUESTION_WORDS = frozenset({
+    'what', 'who', 'why', 'how', 'when', 'where', 'which', 'is', 'are', 'does',
+    'explain', 'describe', 'define', 'compare', 'list', 'summarize', 'tell'
+})
+
+# Query cleanup: ASCII punctuation other than ?.!, (and _, a word character) becomes
+# a space; the regex handles non-ASCII input with the same semantics
+_QUERY_PUNCT_TABLE = str.maketrans({c: ' ' for c in string.punctuation if c not in '?.!,_'})
+_QUERY_CLEAN_RE = re.compile(r'[^\w\s?.!,]')
+
+# Full-text query parsing patterns, compiled once
+_QUOTED_RE = re.compile(r'"([^"]*)"')
+_QUOTED_STRIP_RE = re.compile(r'"[^"]*"')
+_FTS_SPECIAL_RE = re.compile(r'[+\-=&|><!(){}[\]^"~*?:/\\]')
+
+# Process-wide caches shared by all engine instances (the API creates one per request)
+_cache_lock = threading.Lock()
+_embedding_cache = LRUCache(maxsize=config.retrieval['search'].get('embedding_cache_size', 1024))
+_expansion_cache = LRUCache(maxsize=config.retrieval['search'].get('expansion_cache_size', 1024))
+_llm_cache = TTLCache(
+    maxsize=config.retrieval['response_generation'].get('llm_cache_size', 512),
+    ttl=config.retrieval['response_generation'].get('llm_cache_ttl', 3600)
+)
+_llm_cache_stats = {'hits': 0, 'misses': 0}
+# Text/vector search rows, cleared whenever the Document_Embeddings version changes
+_search_results_cache = TTLCache(
+    maxsize=config.retrieval['search'].get('result_cache_size', 512),
+    ttl=config.retrieval['search'].get('result_cache_ttl', 300)
+)
+_search_cache_stats = {'hits': 0, 'misses': 0}
+_corpus_version: Optional[Tuple] = None
+_corpus_version_checked_at = 0.0
+_entity_vocab: Optional[FrozenSet[str]] = None
+_entity_vocab_loaded_at = 0.0
+_executor = ThreadPoolExecutor(
+    max_workers=config.retrieval.get('db_pool_size', 8),
+    thread_name_prefix="rag-search"
+)
+_response_cache = SemanticQueryCache(
+    dims=config.embedding_dims,
+    capacity=config.retrieval['search'].get('semantic_cache_size', 256),
+    threshold=config.retrieval['search'].get('semantic_cache_tau', 0.97),
+    ttl=config.retrieval['search'].get('semantic_cache_ttl', 3600)
+)
+_query_cache = QueryCacheStore(
+    dims=config.embedding_dims,
+    ttl_days=config.retrieval['search'].get('query_cache_ttl_days', 7)
+)
+_query_cache_evicted_at = 0.0
+_embedding_batcher: Optional[EmbeddingBatcher] = None
+
+_debug_queue: "queue.Queue[Tuple[str, Dict]]" = queue.Queue(maxsize=256)
+_debug_writer_thread: Optional[threading.Thread] = None
+# .env is read by the first engine in each process rather than by every per-request instance
+_env_loaded = False
+# RAG prompt template, read from disk on first use (see RAGQueryEngine.reload_prompt)
+_PROMPT_PATH = os.path.join(os.path.dirname(__file__), 'prompts', 'rag_prompt.md')
+_prompt_template: Optional[str] = None
+
+
+def _debug_writer(debug_dir: str) -> None:
+    """Drain the debug queue and write each entry to its own JSON file."""
+    while True:
+        stage, data = _debug_queue.get()
+        try:
+            filename = f"rag_query_{stage}_{time.time_ns()}.json"
+            filepath = os.path.join(debug_dir, filename)
+            with open(filepath, 'wb') as f:
+                f.write(orjson.dumps(data, default=str))
+            logger.debug(f"Debug output for {stage} saved to {filepath}")
+        except Exception as e:
+            logger.warning(f"Failed to save debug output: {str(e)}")
+
+
+def _frozen_vector(vec: np.ndarray) -> np.ndarray:
+    """Mark a cached embedding read-only so callers can share it without copying."""
+    vec.flags.writeable = False
+    return vec
+
+
+def load_embedding_cache(path: Optional[str] = None) -> int:
+    """
+    Load query embeddings saved by save_embedding_cache into the in-process cache.
+    
+    Args:
+        path: JSON file written by save_embedding_cache (defaults to search.embedding_cache_path)
+        
+    Returns:
+        Number of embeddings loaded
+    """
+    if path is None:
+        path = config.retrieval['search'].get('embedding_cache_path')
+    if not path or not os.path.exists(path):
+        return 0
+    try:
+        with open(path, 'rb') as f:
+            entries = orjson.loads(f.read())
+        with _cache_lock:
+            for model, dims, text, embedding in entries:
+                _embedding_cache[(model, dims, text)] = _frozen_vector(np.asarray(embedding, dtype=np.float32))
+        logger.info(f"Loaded {len(entries)} cached query embeddings from {path}")
+        return len(entries)
+    except Exception as e:
+        logger.warning(f"Failed to load embedding cache: {str(e)}")
+        return 0
+
+
+def save_embedding_cache(path: Optional[str] = None) -> int:
+    """
+    Write the in-process query embedding cache to disk so it survives restarts.
+    
+    Args:
+        path: Destination JSON file (defaults to search.embedding_cache_path)
+        
+    Returns:
+        Number of embeddings saved
+    """
+    if path is None:
+        path = config.retrieval['search'].get('embedding_cache_path')
+    if not path:
+        return 0
+    try:
+        with _cache_lock:
+            entries = [[*key, embedding.tolist()] for key, embedding in _embedding_cache.items()]
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(orjson.dumps(entries))
+        logger.info(f"Saved {len(entries)} cached query embeddings to {path}")
+        return len(entries)
+    except Exception as e:
+        logger.warning(f"Failed to save embedding cache: {str(e)}")
+        return 0
+
+
+@lru_cache(maxsize=1024)
+def _content_terms(content: str) -> FrozenSet[str]:
+    """
+    Tokenize document content into candidate entity names.
+    
+    Popular chunks come back for many queries, so the term sets are memoized.
+    """
+    # Map punctuation to spaces in one C-level pass when the content is ASCII
+    if content.isascii():
+        content = content.translate(_PUNCT_TABLE)
+    else:
+        content = _TERM_CLEAN_RE.sub(' ', content)
+    words = content.lower().split()
+    return frozenset(word for word in words if len(word) > 2) - _STOPWORDS
+
+
+def backfill_chunk_entities(db: DatabaseConnection, batch_size: int = 500) -> int:
+    """
+    Link chunks ingested before Chunk_Entities existed to the entities they mention.
+    
+    Uses the same term matching that search otherwise falls back to per query,
+    so after a backfill every chunk's entities come from the Chunk_Entities join.
+    
+    Args:
+        db: Open DatabaseConnection
+        batch_size: Chunks read per round-trip
+        
+    Returns:
+        Number of chunk-entity links inserted
+    """
+    name_to_ids: Dict[str, List[int]] = {}
+    for entity_id, name in db.execute_query("SELECT entity_id, LOWER(name) FROM Entities"):
+        if name:
+            name_to_ids.setdefault(name, []).append(entity_id)
+    
+    linked = 0
+    last_id = 0
+    while True:
+        # Keyset pagination, so chunks that match nothing are not read again
+        rows = db.execute_query(
+            """
+            SELECT de.embedding_id, de.content FROM Document_Embeddings de
+            WHERE de.embedding_id > %s
+            AND NOT EXISTS (SELECT 1 FROM Chunk_Entities ce WHERE ce.embedding_id = de.embedding_id)
+            ORDER BY de.embedding_id
+            LIMIT %s
+            """,
+            (last_id, batch_size)
+        )
+        if not rows:
+            break
+        links = [
+            (embedding_id, entity_id)
+            for embedding_id, content in rows if content
+            # Bypass the memo so a full-table pass doesn't evict the hot query-time entries
+            for term in _content_terms.__wrapped__(content)
+            for entity_id in name_to_ids.get(term, ())
+        ]
+        if links:
+            db.execute_query(
+                f"INSERT IGNORE INTO Chunk_Entities (embedding_id, entity_id) VALUES "
+                f"{', '.join(['(%s, %s)'] * len(links))}",
+                tuple(value for link in links for value in link)
+            )
+        linked += len(links)
+        last_id = rows[-1][0]
+        logger.info(f"Linked {linked} chunk entities through embedding_id {last_id}")
+    return linked
+
+
+def _best_chunk_per_doc(rows: List[Dict], score_key: str) -> Tuple[Dict[Any, Dict], float]:
+    """
+    Index search rows by doc_id, keeping the best-scoring chunk of each doc.
+    
+    Returns:
+        (doc_id -> row, max score clamped at 0)
+    """
+    best: Dict[Any, Dict] = {}
+    max_score = 0.0
+    for r in rows:
+        score = r.get(score_key, 0)
+        if score > max_score:
+            max_score = score
+        current = best.get(r['doc_id'])
+        if current is None or score > current.get(score_key, 0):
+            best[r['doc_id']] = r
+    return best, max_score
+
+
+def _in_list(values) -> Tuple[str, tuple]:
+    """
+    Build placeholders and parameters for a SQL IN list.
+    
+    The list is padded (repeating its last value) to the next power of two, so
+    lookups with varying term counts share a handful of statement shapes and
+    their cached plans.
+    """
+    params = tuple(values)
+    size = 1 << (len(params) - 1).bit_length()
+    params += params[-1:] * (size - len(params))
+    return ', '.join(['%s'] * size), params
+
+
+@lru_cache(maxsize=None)
+def _relationship_sql(placeholders: str) -> str:
+    """
+    Build the relationship lookup for an IN list of entity ids.
+    
+    Each side of the match is its own SELECT so both use their hash index on
+    Relationships instead of an OR across two keys; UNION removes the rows
+    that match on both sides. Parameters: ids, ids, limit.
+    """
+    return f"""
+        SELECT source_entity_id, target_entity_id, relation_type, doc_id
+        FROM Relationships
+        WHERE source_entity_id IN ({placeholders})
+        UNION
+        SELECT source_entity_id, target_entity_id, relation_type, doc_id
+        FROM Relationships
+        WHERE target_entity_id IN ({placeholders})
+        LIMIT %s
+    """
+
+
+@lru_cache(maxsize=None)
+def _vector_sql(dims: int, int8_prefilter: bool) -> str:
+    """
+    Build the vector search SELECT once per shape, so every query sends identical SQL text.
+    
+    The LIMITs stay bind parameters: SingleStore parameterizes literals before plan
+    lookup anyway, so inlining common limit values would not add plan reuse.
+    """
+    if int8_prefilter:
+        # Scan the int8 copy (4x less memory bandwidth), then rerank the
+        # surviving candidates against the float32 column. Each row is quantized
+        # with its own scale, so multiply it back in to rank rows comparably.
+        return f"""
+            SELECT doc_id, (embedding <*> (%s :> VECTOR({dims}, F32))) AS score, embedding_id
+            FROM (
+                SELECT doc_id, embedding, embedding_id
+                FROM Document_Embeddings
+                ORDER BY (embedding_i8 <*> (%s :> VECTOR({dims}, I8))) * embedding_i8_scale DESC
+                LIMIT %s
+            ) AS candidates
+            ORDER BY score DESC
+            LIMIT %s
+        """
+    return f"""
+        SELECT doc_id, (embedding <*> (%s :> VECTOR({dims}, F32))) AS score, embedding_id
+        FROM Document_Embeddings
+        ORDER BY score DESC
+        LIMIT %s
+    """
+
+
 class RAGQueryEngine:
     """Implements hybrid search combining vector similarity, text search, and knowledge graph."""
     
@@ -39,9 +369,16 @@ class RAGQueryEngine:
         Args:
             debug_output: If True, enable debug output mode
         """
-        # Load environment variables
-        load_dotenv(override=True)
-        logger.info("Environment variables loaded")
+        global _env_loaded
+        # Imported here so processes that load this module without querying skip the SDK import
+        from openai import OpenAI
+        
+        # Load environment variables once per process
+        if not _env_loaded:
+            from dotenv import load_dotenv
+            load_dotenv(override=True)
+            _env_loaded = True
+            logger.info("Environment variables loaded")
         
         # Get configuration
         self.search_config = config.retrieval['search']
@@ -78,152 +415,438 @@ class RAGQueryEngine:
         if self.debug_output:
             os.makedirs(self.debug_dir, exist_ok=True)
 
-    def get_query_embedding(self, query: str) -> List[float]:
-        """Get embedding for the query text."""
+    def get_query_embedding(self, query: str, no_cache: bool = False) -> np.ndarray:
+        """Get embedding for the query text, reusing cached embeddings for repeated queries."""
+        return self.get_query_embeddings([query], no_cache=no_cache)[0]
+
+    def get_query_embeddings(self, texts: List[str], no_cache: bool = False) -> List[np.ndarray]:
+        """
+        Get embeddings for several texts with a single batched API call.
+        
+        Cached texts are served from the embedding cache; only the misses are sent,
+        in one request (the embeddings API accepts up to 2048 inputs per call).
+        
+        Args:
+            texts: Texts to embed
+            no_cache: If True, bypass the embedding cache so the texts are neither
+                looked up nor stored (and never reach the persisted cache file)
+            
+        Returns:
+            Read-only float32 embeddings in the same order as texts
+        """
+        if no_cache:
+            cached = [None] * len(texts)
+        else:
+            keys = [(config.embedding_model, config.embedding_dims, text) for text in texts]
+            with _cache_lock:
+                cached = [_embedding_cache.get(key) for key in keys]
+        missing = list(dict.fromkeys(text for text, hit in zip(texts, cached) if hit is None))
+        if len(missing) < len(texts):
+            logger.debug("Query embedding cache hit")
+        
+        fetched: Dict[str, np.ndarray] = {}
+        if missing:
+            try:
+                if self.search_config.get('embedding_batching', True):
+                    # Coalesce with misses from concurrent queries into shared API calls
+                    embeddings = self._get_embedding_batcher().embed(missing)
+                else:
+                    embeddings = self._create_embeddings(missing)
+            except Exception as e:
+                logger.error(f"Error getting query embedding: {str(e)}")
+                raise
+            fetched = {text: _frozen_vector(embedding) for text, embedding in zip(missing, embeddings)}
+            if not no_cache:
+                with _cache_lock:
+                    for text, embedding in fetched.items():
+                        _embedding_cache[(config.embedding_model, config.embedding_dims, text)] = embedding
+        
+        return [hit if hit is not None else fetched[text] for text, hit in zip(texts, cached)]
+
+    def _create_embeddings(self, texts: List[str]) -> List[np.ndarray]:
+        """Embed texts with one embeddings API call."""
+        # base64 transfers packed float32 values, decoded straight into arrays
+        # instead of parsing and boxing one JSON float per dimension
+        response = self.embedding_client.embeddings.create(
+            model=config.embedding_model,
+            input=texts,
+            dimensions=config.embedding_dims,
+            encoding_format="base64"
+        )
+        return [normalize_l2(np.frombuffer(base64.b64decode(d.embedding), dtype='<f4')) for d in response.data]
+
+    def _get_embedding_batcher(self) -> EmbeddingBatcher:
+        """Get the process-wide embedding batcher, creating it on first use."""
+        global _embedding_batcher
+        with _cache_lock:
+            if _embedding_batcher is None:
+                _embedding_batcher = EmbeddingBatcher(
+                    self._create_embeddings,
+                    max_batch=self.search_config.get('embedding_batch_size', 256),
+                    max_delay=self.search_config.get('embedding_batch_window_ms', 0) / 1000,
+                    timeout=self.search_config.get('embedding_batch_timeout', 30)
+                )
+            return _embedding_batcher
+
+    def _vector_search_sql(self, query_embedding: List[float], limit: int) -> Tuple[str, tuple]:
+        """Get the vector similarity SELECT (without a trailing semicolon) and its parameters."""
+        # Send the vector as packed little-endian float32 bytes instead of a
+        # decimal string, and bind it in the SELECT to avoid a separate SET round-trip
+        vector_param = pack_float32(query_embedding)
+        
+        if self.search_config.get('int8_prefilter', False):
+            candidates = limit * self.search_config.get('int8_candidate_factor', 4)
+            sql = _vector_sql(config.embedding_dims, int8_prefilter=True)
+            return sql, (vector_param, quantize_int8(query_embedding), candidates, limit)
+        
+        return _vector_sql(config.embedding_dims, int8_prefilter=False), (vector_param, limit)
+
+    def _check_corpus_version(self, db: DatabaseConnection) -> Optional[Tuple]:
+        """
+        Clear cached search results if Document_Embeddings changed since the last check.
+        
+        Ingestion runs in the Celery worker, so the version (row count and highest
+        embedding_id) is read from the table, at most every result_cache_version_interval seconds.
+        
+        Returns:
+            The latest known version, or None if it has never been read
+        """
+        global _corpus_version, _corpus_version_checked_at
+        interval = self.search_config.get('result_cache_version_interval', 5)
+        with _cache_lock:
+            if time.time() - _corpus_version_checked_at < interval:
+                return _corpus_version
+            _corpus_version_checked_at = time.time()
+        
         try:
-            response = self.embedding_client.embeddings.create(
-                model="text-embedding-ada-002",
-                input=query
-            )
-            return response.data[0].embedding
+            version = tuple(db.execute_query("SELECT COUNT(*), MAX(embedding_id) FROM Document_Embeddings")[0])
         except Exception as e:
-            logger.error(f"Error getting query embedding: {str(e)}")
-            raise
+            logger.warning(f"Failed to check Document_Embeddings version: {str(e)}")
+            return _corpus_version
+        
+        with _cache_lock:
+            if version != _corpus_version:
+                if _corpus_version is not None:
+                    logger.info("Document_Embeddings changed, clearing cached search results")
+                _search_results_cache.clear()
+                _corpus_version = version
+        return version
 
-    def vector_search(self, db: DatabaseConnection, query_embedding: List[float], limit: int = 10) -> List[Dict]:
-        """Perform vector similarity search."""
+    def _corpus_version_tag(self, db: DatabaseConnection) -> Optional[str]:
+        """Current Document_Embeddings version in the form stored in Query_Cache.corpus_version."""
+        version = self._check_corpus_version(db)
+        return None if version is None else f"{version[0]}:{version[1]}"
+
+    def _cached_search(self, db: DatabaseConnection, key: Tuple, search_fn: Callable[[], List[Dict]],
+                       no_cache: bool = False) -> List[Dict]:
+        """
+        Return cached rows for a search key, running search_fn on a miss.
+        
+        Cached row dicts are shared between queries and must not be modified.
+        With no_cache the cache is neither read nor written.
+        """
+        if no_cache or not self.search_config.get('result_cache_enabled', True):
+            return search_fn()
+        
+        self._check_corpus_version(db)
+        with _cache_lock:
+            results = _search_results_cache.get(key)
+            if results is not None:
+                _search_cache_stats['hits'] += 1
+                return results
+            _search_cache_stats['misses'] += 1
+        
+        results = search_fn()
+        with _cache_lock:
+            _search_results_cache[key] = results
+        return results
+
+    def vector_search(self, db: DatabaseConnection, query_embedding: List[float], limit: int = 10,
+                      no_cache: bool = False) -> List[Dict]:
+        """Perform vector similarity search (no_cache bypasses the search results cache)."""
         try:
-            # Format vector for SQL
-            vector_param = "[" + ",".join(f"{x:.6f}" for x in query_embedding) + "]"
+            vector_search_sql, params = self._vector_search_sql(query_embedding, limit)
             
-            # Set vector parameter
-            db.execute_query("SET @qvec = %s :> VECTOR(1536);", (vector_param,))
+            def run() -> List[Dict]:
+                results = db.execute_query(vector_search_sql, params)
+                return [
+                    {"doc_id": r[0], "score": r[1], "embedding_id": r[2]}
+                    for r in results
+                ]
             
-            # Execute search
-            vector_search_sql = """
-                SELECT doc_id, content, (embedding <*> @qvec) AS score
-                FROM Document_Embeddings
-                ORDER BY score DESC
-                LIMIT %s;
-            """
-            
-            results = db.execute_query(vector_search_sql, (limit,))
-            
-            return [
-                {"doc_id": r[0], "content": r[1], "score": r[2]}
-                for r in results
-            ]
+            # params[0] is the packed query vector; key on its digest with the statement shape
+            key = ('v', hashlib.sha1(params[0]).digest(), vector_search_sql, params[1:])
+            return self._cached_search(db, key, run, no_cache)
         except Exception as e:
             logger.error(f"Error in vector search: {str(e)}")
             raise
 
-    def text_search(self, db: DatabaseConnection, query: str, limit: int = 10) -> List[Dict]:
-        """Perform full-text keyword search using Full-Text Search Version 2."""
-        try:
-            # Limit query length to prevent parser errors
-            max_query_length = self.search_config.get('max_query_length', 500)
-            if len(query) > max_query_length:
-                # Take first N chars of original query + important keywords
-                words = query.split()
-                base_query = ' '.join(words[:10])  # First 10 words
-                important_words = [w for w in words[10:] if len(w) > 3][:20]  # Up to 20 important keywords
-                query = f"{base_query} {' '.join(important_words)}"
-                logger.info(f"Query truncated to: {query}")
-
-            # Replace hyphens with spaces for better matching
-            query = query.replace('-', ' ')
-            
-            # Extract key phrases (quoted terms)
-            key_phrases = re.findall(r'"([^"]*)"', query)
-            remaining_text = re.sub(r'"[^"]*"', '', query)
-            
-            # Split remaining text into terms and clean them
-            terms = set()  # Use set to deduplicate
-            multi_word_terms = set()  # For terms with spaces
-            
-            for t in remaining_text.split():
+    def _pooled_text_search(self, query: str, limit: int, no_cache: bool = False) -> List[Dict]:
+        """Run text_search on its own pooled connection (used from the executor)."""
+        with get_pool().acquire() as db:
+            return self.text_search(db, query, limit=limit, no_cache=no_cache)
+
+    def _build_fts_query(self, query: str) -> Optional[str]:
+        """
+        Build the Full-Text Search Version 2 expression for a query.
+        
+        Returns:
+            Expression to pass to MATCH ... AGAINST, or None if the query has no usable terms
+        """
+        # Limit query length to prevent parser errors
+        max_query_length = self.search_config.get('max_query_length', 500)
+        if len(query) > max_query_length:
+            # Take first N chars of original query + important keywords
+            words = query.split()
+            base_query = ' '.join(words[:10])  # First 10 words
+            important_words = [w for w in words[10:] if len(w) > 3][:20]  # Up to 20 important keywords
+            query = f"{base_query} {' '.join(important_words)}"
+            logger.info(f"Query truncated to: {query}")
+
+        # Replace hyphens with spaces for better matching
+        query = query.replace('-', ' ')
+        
+        # Extract key phrases (quoted terms)
+        key_phrases = _QUOTED_RE.findall(query)
+        remaining_text = _QUOTED_STRIP_RE.sub('', query)
+        
+        # Split remaining text into terms and clean them; dicts dedupe while
+        # keeping query order, so the original terms win over expansion terms
+        terms: Dict[str, None] = {}
+        multi_word_terms: Dict[str, None] = {}
+        
+        for t in remaining_text.split():
+            t = t.strip()
+            if t:
+                # Escape special characters that could break the parser
+                t = _FTS_SPECIAL_RE.sub(' ', t)
                 t = t.strip()
                 if t:
-                    # Escape special characters that could break the parser
-                    t = re.sub(r'[+\-=&|><!(){}[\]^"~*?:/\\]', ' ', t)
-                    t = t.strip()
-                    if t:
-                        if ' ' in t:
-                            multi_word_terms.add(t)
-                        elif len(t) > 2:  # Only add single words if longer than 2 chars
-                            terms.add(t.lower())  # Normalize to lowercase
-            
-            # Build search expression with semantic operators
-            search_parts = []
-            
-            # Add exact phrases with high weight
-            for phrase in key_phrases:
+                    if ' ' in t:
+                        multi_word_terms[t] = None
+                    elif len(t) > 2:  # Only add single words if longer than 2 chars
+                        terms[t.lower()] = None  # Normalize to lowercase
+        
+        # Cap the term list so long GPT expansions don't produce huge OR expressions
+        max_terms = self.search_config.get('max_search_terms', 32)
+        terms = list(terms)[:max_terms]
+        
+        # Build search expression with semantic operators
+        search_parts = []
+        
+        # Add exact phrases with high weight
+        for phrase in key_phrases:
+            if phrase:
+                # Escape special characters in phrases
+                phrase = _FTS_SPECIAL_RE.sub(' ', phrase)
+                phrase = phrase.strip()
                 if phrase:
-                    # Escape special characters in phrases
-                    phrase = re.sub(r'[+\-=&|><!(){}[\]^"~*?:/\\]', ' ', phrase)
-                    phrase = phrase.strip()
-                    if phrase:
-                        search_parts.append(f'content:"{phrase}">>{self.search_config.get("exact_phrase_weight", 2.0)}')
-            
-            # Add multi-word terms as phrases
-            for term in multi_word_terms:
-                search_parts.append(f'content:"{term}">>{self.search_config.get("exact_phrase_weight", 2.0)}')
-            
-            # Add individual terms with proximity search
-            if terms:
-                # Group terms for proximity search (limited to 5 terms to prevent complexity)
-                proximity_terms = list(terms)[:5]
-                terms_str = ' '.join(proximity_terms)
-                if terms_str:
-                    search_parts.append(f'content:"{terms_str}"~{self.search_config.get("proximity_distance", 5)}')
-                
-                # Add individual terms with lower weight (avoiding duplicates)
-                for term in terms:
-                    search_parts.append(f'content:{term}>>{self.search_config.get("single_term_weight", 1.5)}')
+                    search_parts.append(f'content:"{phrase}">>{self.search_config.get("exact_phrase_weight", 2.0)}')
+        
+        # Add multi-word terms as phrases
+        for term in multi_word_terms:
+            search_parts.append(f'content:"{term}">>{self.search_config.get("exact_phrase_weight", 2.0)}')
+        
+        # Add individual terms with proximity search
+        if terms:
+            # Group terms for proximity search (limited to 5 terms to prevent complexity)
+            proximity_terms = terms[:5]
+            terms_str = ' '.join(proximity_terms)
+            if terms_str:
+                search_parts.append(f'content:"{terms_str}"~{self.search_config.get("proximity_distance", 5)}')
+            
+            # Add individual terms with lower weight (avoiding duplicates)
+            for term in terms:
+                search_parts.append(f'content:{term}>>{self.search_config.get("single_term_weight", 1.5)}')
+        
+        if not search_parts:
+            return None
+        
+        # Combine all parts with OR (limit number of clauses)
+        search_parts = search_parts[:50]  # Limit to prevent too complex queries
+        formatted_query = ' OR '.join(search_parts)
+        logger.info(f"Text search query: {formatted_query}")
+        return formatted_query
+
+    def text_search(self, db: DatabaseConnection, query: str, limit: int = 10,
+                    no_cache: bool = False) -> List[Dict]:
+        """Perform full-text keyword search using Full-Text Search Version 2 (no_cache bypasses the search results cache)."""
+        try:
+            formatted_query = self._build_fts_query(query)
             
             # Return empty results if no search terms found
-            if not search_parts:
+            if formatted_query is None:
                 logger.info("No valid search terms found, returning empty results")
                 return []
             
-            # Combine all parts with OR (limit number of clauses)
-            search_parts = search_parts[:50]  # Limit to prevent too complex queries
-            formatted_query = ' OR '.join(search_parts)
-            logger.info(f"Text search query: {formatted_query}")
-            
+            # Evaluate MATCH once per row and filter on the alias
+            # The WHERE predicate lets the full-text index pick the matching rows
             sql = """
                 SELECT 
                     doc_id,
-                    content,
-                    MATCH(TABLE Document_Embeddings) AGAINST(%s) as text_score
+                    MATCH(TABLE Document_Embeddings) AGAINST(%s) as text_score,
+                    embedding_id
                 FROM Document_Embeddings 
                 WHERE MATCH(TABLE Document_Embeddings) AGAINST(%s)
                 ORDER BY text_score DESC
                 LIMIT %s;
             """
             
-            results = db.execute_query(sql, (formatted_query, formatted_query, limit))
+            def run() -> List[Dict]:
+                results = db.execute_query(sql, (formatted_query, formatted_query, limit))
+                return [
+                    {
+                        "doc_id": r[0],
+                        "text_score": float(r[1]),
+                        "embedding_id": r[2]
+                    }
+                    for r in results
+                ]
             
-            return [
-                {
-                    "doc_id": r[0],
-                    "content": r[1],
-                    "text_score": float(r[2])
-                }
-                for r in results
-            ]
+            # Keyed on the built expression, so queries that normalize the same share an entry
+            return self._cached_search(db, ('t', formatted_query, limit), run, no_cache)
             
         except Exception as e:
             logger.error(f"Error in text search: {str(e)}")
             return []
 
+    def fused_search(
+        self,
+        db: DatabaseConnection,
+        query_embedding: List[float],
+        text_query: str,
+        limit: int = 10,
+        top_k: int = 5
+    ) -> List[Dict]:
+        """
+        Run vector and full-text search and fuse their scores in one statement.
+        
+        Applies the same fusion as merge_search_results on the server: each
+        branch is normalized by its max score and reduced to its best-scoring
+        chunk per doc, combined with the configured weights (multiplied by the
+        number of matching branches for CombMNZ), filtered by min_score_threshold
+        and ranked, so only the final top_k rows are returned, joined back to
+        their chunk text. A doc is represented by its best vector chunk, or its
+        best text chunk if the vector branch did not find it.
+        
+        Args:
+            db: Database connection
+            query_embedding: Query embedding for the vector branch
+            text_query: Query text for the full-text branch
+            limit: Candidates taken from each branch
+            top_k: Number of fused results to return
+            
+        Returns:
+            Results shaped like merge_search_results output
+        """
+        vector_weight = self.search_config.get('vector_weight', 0.7)
+        min_score = self.search_config.get('min_score_threshold', 0.15)
+        vector_sql, params = self._vector_search_sql(query_embedding, limit)
+        
+        combined = "%s * MAX(vs) + %s * MAX(ts)"
+        if self.search_config.get('fusion', 'linear') == 'combmnz':
+            combined = f"({combined}) * ((MAX(vs) > 0) + (MAX(ts) > 0))"
+        
+        # Scale by 1/max, treating a non-positive max as 0 like merge_search_results
+        vs = "COALESCE(score / NULLIF(GREATEST(MAX(score) OVER (), 0), 0), 0)"
+        if self.search_config.get('vector_score_norm', 'max') == 'cosine':
+            vs = "(score + 1) * 0.5"
+        # Each branch keeps one row per doc: its best-scoring chunk
+        sources = f"""
+            SELECT doc_id, embedding_id AS v_embedding_id, NULL AS t_embedding_id, vs, 0 AS ts
+            FROM (
+                SELECT doc_id, embedding_id, {vs} AS vs,
+                       ROW_NUMBER() OVER (PARTITION BY doc_id ORDER BY score DESC) AS rn
+                FROM v
+            ) AS vb
+            WHERE rn = 1
+        """
+        ctes = f"WITH v AS ({vector_sql})"
+        
+        try:
+            formatted_query = self._build_fts_query(text_query)
+        except Exception as e:
+            logger.error(f"Error in text search: {str(e)}")
+            formatted_query = None
+        if formatted_query is not None:
+            ctes += """,
+            t AS (
+                SELECT doc_id, embedding_id, MATCH(TABLE Document_Embeddings) AGAINST(%s) AS score
+                FROM Document_Embeddings
+                WHERE MATCH(TABLE Document_Embeddings) AGAINST(%s)
+                ORDER BY score DESC
+                LIMIT %s
+            )"""
+            params += (formatted_query, formatted_query, limit)
+            sources += """
+            UNION ALL
+            SELECT doc_id, NULL AS v_embedding_id, embedding_id AS t_embedding_id, 0 AS vs, ts
+            FROM (
+                SELECT doc_id, embedding_id,
+                       COALESCE(score / NULLIF(GREATEST(MAX(score) OVER (), 0), 0), 0) AS ts,
+                       ROW_NUMBER() OVER (PARTITION BY doc_id ORDER BY score DESC) AS rn
+                FROM t
+            ) AS tb
+            WHERE rn = 1
+            """
+        
+        # Content is read only for the fused top_k, in the same round-trip
+        sql = f"""
+            {ctes}
+            SELECT f.doc_id, f.embedding_id, f.vector_score, f.text_score, f.combined_score, d.content
+            FROM (
+                SELECT doc_id, COALESCE(MAX(v_embedding_id), MAX(t_embedding_id)) AS embedding_id,
+                       MAX(vs) AS vector_score, MAX(ts) AS text_score,
+                       {combined} AS combined_score
+                FROM ({sources}) AS scored
+                GROUP BY doc_id
+                HAVING combined_score >= %s
+                ORDER BY combined_score DESC
+                LIMIT %s
+            ) AS f
+            LEFT JOIN Document_Embeddings d ON d.embedding_id = f.embedding_id
+            ORDER BY f.combined_score DESC
+        """
+        params += (vector_weight, 1 - vector_weight, min_score, top_k)
+        
+        try:
+            results = db.execute_query(sql, params)
+        except Exception as e:
+            logger.error(f"Error in fused search: {str(e)}")
+            raise
+        
+        logger.info(f"Fused search returned {len(results)} results")
+        return [
+            {
+                "doc_id": r[0],
+                "embedding_id": r[1],
+                "vector_score": float(r[2]),
+                "text_score": float(r[3]),
+                "combined_score": float(r[4]),
+                "content": r[5] or ""
+            }
+            for r in results
+        ]
+
     def merge_search_results(
             self, 
             vector_results: List[Dict], 
             text_results: List[Dict],
-            vector_weight: float = None
+            vector_weight: float = None,
+            top_k: Optional[int] = None
         ) -> List[Dict]:
-        """Merge and rank results from vector and text searches."""
+        """
+        Merge and rank results from vector and text searches.
+        
+        Args:
+            vector_results: Rows from vector_search
+            text_results: Rows from text_search
+            vector_weight: Weight of the vector score; defaults to the configured weight
+            top_k: If given, only the top_k results are selected and materialized
+            
+        Returns:
+            Merged results sorted by combined score
+        """
         try:
             # Use config weight if not specified
             if vector_weight is None:
@@ -233,52 +856,101 @@ class RAGQueryEngine:
             logger.info(f"Merging with weights - vector: {vector_weight}, text: {text_weight}")
             logger.info(f"Input results - vector: {len(vector_results)}, text: {len(text_results)}")
             
-            # Normalize scores
-            vec_max = max([r.get('score', 0) for r in vector_results]) if vector_results else 1.0
-            txt_max = max([r.get('text_score', 0) for r in text_results]) if text_results else 1.0
-            logger.info(f"Max scores - vector: {vec_max}, text: {txt_max}")
+            # Index both result sets by doc_id, keeping each doc's best-scoring chunk
+            # (as fused_search does) and tracking the max scores in the same pass
+            vector_map, vec_max = _best_chunk_per_doc(vector_results, 'score')
+            if self.search_config.get('vector_score_norm', 'max') == 'cosine':
+                # Unit-length embeddings make the dot product a cosine in [-1, 1],
+                # which maps onto [0, 1] without looking at the other results
+                vec_shift, vec_scale = 1.0, 0.5
+            else:
+                vec_shift, vec_scale = 0.0, (1.0 / vec_max if vec_max > 0 else 0.0)
             
-            # Create a map of doc_id to result for both result sets
-            vector_map = {r['doc_id']: {
-                **r,
-                'vector_score': r.get('score', 0) / vec_max if vec_max else 0
-            } for r in vector_results}
+            text_map, txt_max = _best_chunk_per_doc(text_results, 'text_score')
+            logger.info(f"Max scores - vector: {vec_max}, text: {txt_max}")
             
-            text_map = {r['doc_id']: {
-                **r,
-                'text_score': r.get('text_score', 0) / txt_max if txt_max else 0
-            } for r in text_results}
+            # Normalize by scaling rather than building normalized copies of each result
+            txt_scale = 1.0 / txt_max if txt_max > 0 else 0.0
             
             logger.info(f"Unique docs - vector: {len(vector_map)}, text: {len(text_map)}")
             
             # Get all unique doc_ids
-            all_doc_ids = set(vector_map.keys()) | set(text_map.keys())
+            all_doc_ids = vector_map.keys() | text_map.keys()
             logger.info(f"Total unique docs before merging: {len(all_doc_ids)}")
             
-            # Combine scores
-            merged = []
-            for doc_id in all_doc_ids:
-                vector_result = vector_map.get(doc_id, {'vector_score': 0})
-                text_result = text_map.get(doc_id, {'text_score': 0})
+            # Only include results that meet the minimum score threshold
+            min_score = self.search_config.get('min_score_threshold', 0.15)
+            
+            # CombMNZ multiplies the weighted sum by the number of sources that found the doc
+            comb_mnz = self.search_config.get('fusion', 'linear') == 'combmnz'
+            
+            if len(all_doc_ids) < 8:
+                # For a handful of docs a plain loop is cheaper than array setup
+                merged = []
+                for doc_id in all_doc_ids:
+                    vector_result = vector_map.get(doc_id, {})
+                    text_result = text_map.get(doc_id, {})
+                    vector_score = (vector_result.get('score', 0) + vec_shift) * vec_scale if vector_result else 0.0
+                    text_score = text_result.get('text_score', 0) * txt_scale
+                    
+                    combined_score = vector_weight * vector_score + text_weight * text_score
+                    if comb_mnz:
+                        combined_score *= (vector_score > 0) + (text_score > 0)
+                    
+                    if combined_score >= min_score:
+                        merged.append({
+                            'doc_id': doc_id,
+                            'embedding_id': (vector_result or text_result).get('embedding_id'),
+                            'vector_score': vector_score,
+                            'text_score': text_score,
+                            'combined_score': combined_score
+                        })
                 
-                combined_score = (
-                    vector_weight * vector_result.get('vector_score', 0) +
-                    text_weight * text_result.get('text_score', 0)
+                # Sort by combined score, or just select the best top_k
+                if top_k is not None:
+                    merged = heapq.nlargest(top_k, merged, key=itemgetter('combined_score'))
+                else:
+                    merged.sort(key=itemgetter('combined_score'), reverse=True)
+            else:
+                # Align both score sets on a common doc index and combine in one pass
+                doc_ids = list(all_doc_ids)
+                index = {doc_id: i for i, doc_id in enumerate(doc_ids)}
+                vec_scores = np.zeros(len(doc_ids))
+                txt_scores = np.zeros(len(doc_ids))
+                # Scatter each source's scores into the aligned arrays with one fancy-index write
+                vec_idx = np.fromiter(map(index.__getitem__, vector_map), dtype=np.intp, count=len(vector_map))
+                vec_scores[vec_idx] = (np.fromiter(
+                    (r.get('score', 0) for r in vector_map.values()), dtype=np.float64, count=len(vector_map)
+                ) + vec_shift) * vec_scale
+                txt_idx = np.fromiter(map(index.__getitem__, text_map), dtype=np.intp, count=len(text_map))
+                txt_scores[txt_idx] = np.fromiter(
+                    (r.get('text_score', 0) for r in text_map.values()), dtype=np.float64, count=len(text_map)
                 )
+                txt_scores *= txt_scale
+                
+                combined = vector_weight * vec_scores + text_weight * txt_scores
+                if comb_mnz:
+                    combined *= (vec_scores > 0).astype(np.int8) + (txt_scores > 0)
+                keep = np.flatnonzero(combined >= min_score)
+                if top_k is not None and len(keep) > top_k:
+                    # Partial selection of the top_k, O(n) instead of sorting every survivor
+                    keep = np.sort(keep[np.argpartition(-combined[keep], top_k - 1)[:top_k]])
+                order = keep[np.argsort(-combined[keep], kind='stable')]
                 
-                # Only include results that meet the minimum score threshold
-                min_score = self.search_config.get('min_score_threshold', 0.15)
-                if combined_score >= min_score:
+                # Materialize dicts only for surviving docs
+                merged = []
+                for i in order:
+                    doc_id = doc_ids[i]
+                    vector_result = vector_map.get(doc_id, {})
+                    text_result = text_map.get(doc_id, {})
                     merged.append({
                         'doc_id': doc_id,
-                        'content': vector_result.get('content') or text_result.get('content'),
-                        'vector_score': vector_result.get('vector_score', 0),
-                        'text_score': text_result.get('text_score', 0),
-                        'combined_score': combined_score
+                        'embedding_id': (vector_result or text_result).get('embedding_id'),
+                        'vector_score': float(vec_scores[i]),
+                        'text_score': float(txt_scores[i]),
+                        'combined_score': float(combined[i])
                     })
             
-            # Sort by combined score
-            merged.sort(key=lambda x: x['combined_score'], reverse=True)
             logger.info(f"Total results after merging and filtering: {len(merged)}")
             
             return merged
@@ -287,22 +959,42 @@ class RAGQueryEngine:
             logger.error(f"Error merging results: {str(e)}")
             raise
 
-    def preprocess_query(self, query: str) -> str:
+    def preprocess_query(self, query: str, expand: bool = True, no_cache: bool = False) -> str:
         """
         Preprocess the query to improve search accuracy:
         1. Remove special characters but keep important punctuation
         2. Normalize whitespace
-        3. Extract key concepts and expand with synonyms
+        3. Extract key concepts and expand with synonyms (unless expand is False)
+        
+        With no_cache the expansion cache is neither read nor written.
         """
         # Clean and normalize
-        query = re.sub(r'[^\w\s?.!,]', ' ', query)
+        if query.isascii():
+            query = query.translate(_QUERY_PUNCT_TABLE)
+        else:
+            query = _QUERY_CLEAN_RE.sub(' ', query)
         query = ' '.join(query.split())
+        if not expand:
+            return query
+        
+        # Get model based on configuration
+        use_groq = bool(self.groq_api_key and self.response_config.get('groq_base_url'))
+        if use_groq:
+            model = self.response_config.get('query_expansion', {}).get('groq_model', 'mixtral-8x7b-32768')
+        else:
+            model = self.response_config.get('query_expansion', {}).get('openai_model', 'gpt-4o')
+        
+        # Expansion runs at temperature 0, so repeated queries can reuse the result
+        cache_key = (model, query)
+        with _cache_lock:
+            cached = None if no_cache else _expansion_cache.get(cache_key)
+        if cached is not None:
+            logger.info("Query expansion cache hit")
+            return cached
         
         # Extract key concepts using OpenAI or Groq
         try:
-            # Get model based on configuration
-            if self.groq_api_key and self.response_config.get('groq_base_url'):
-                model = self.response_config.get('query_expansion', {}).get('groq_model', 'mixtral-8x7b-32768')
+            if use_groq:
                 logger.info(f"Using Groq model for query expansion: {model}")
                 response = self.response_client.chat.completions.create(
                     model=model,
@@ -317,7 +1009,6 @@ class RAGQueryEngine:
                 )
             else:
                 # Use OpenAI for query expansion
-                model = self.response_config.get('query_expansion', {}).get('openai_model', 'gpt-4o')
                 logger.info(f"Using OpenAI model for query expansion: {model}")
                 response = self.embedding_client.chat.completions.create(
                     model=model,
@@ -338,87 +1029,403 @@ class RAGQueryEngine:
                 expanded_terms.extend(t.strip() for t in concept_group.split(','))
             
             # Combine original query with expanded terms
-            enhanced_query = f"{query} {' '.join(expanded_terms)}"
-            return enhanced_query.strip()
+            enhanced_query = f"{query} {' '.join(expanded_terms)}".strip()
+            if not no_cache:
+                with _cache_lock:
+                    _expansion_cache[cache_key] = enhanced_query
+            return enhanced_query
             
         except Exception as e:
             logger.warning(f"Query expansion failed: {str(e)}")
             return query
 
-    def query(self, query_text: str, top_k: int = 5) -> SearchResponse:
-        """Execute a hybrid search query combining vector and text search."""
+    def query(
+        self,
+        query_text: str,
+        top_k: int = 5,
+        on_results: Optional[Callable[[List[SearchResult]], None]] = None,
+        on_token: Optional[Callable[[str], None]] = None,
+        no_cache: bool = False
+    ) -> SearchResponse:
+        """
+        Execute a hybrid search query combining vector and text search.
+        
+        Args:
+            query_text: User query
+            top_k: Number of results to return
+            on_results: Called with the search results before response generation starts
+            on_token: If given, the LLM response is streamed and each text delta passed here
+            no_cache: If True (e.g. for sensitive queries), bypass every cache the
+                query or its answer could be stored in: the embedding, expansion,
+                search results, LLM response, semantic response and Query_Cache tiers
+            
+        Returns:
+            SearchResponse with the full generated response
+        """
         try:
+            # Exact repeats are served from the shared Query_Cache table before any LLM call
+            use_query_cache = not no_cache and self.search_config.get('query_cache_enabled', True)
+            response_model = self.response_config.get('model', 'gpt-4o')
+            cache_key = QueryCacheStore.make_key(response_model, query_text, top_k)
+            if use_query_cache:
+                cached_response = self._load_cached_response(
+                    lambda db, version: _query_cache.get(db, cache_key, version)
+                )
+                if cached_response is not None:
+                    logger.info("Query cache hit, returning cached response")
+                    return cached_response.model_copy(update={"query": query_text})
+            
+            # Short keyword lookups and quoted phrases skip expansion and vector search
+            lexical = self._is_lexical_query(query_text)
+            if lexical:
+                logger.info("Lexical query, using full-text search only")
+            
             # Preprocess and enhance query
-            enhanced_query = self.preprocess_query(query_text)
+            enhanced_query = self.preprocess_query(query_text, expand=not lexical, no_cache=no_cache)
             logger.info(f"Enhanced query: {enhanced_query}")
             
-            with DatabaseConnection() as db:
-                # Get results from both search methods
-                config_top_k = self.search_config.get('top_k', 20)  # Use config value, default to 20
-                logger.info(f"Using config top_k: {config_top_k}")
+            config_top_k = self.search_config.get('top_k', 20)  # Use config value, default to 20
+            logger.info(f"Using config top_k: {config_top_k}")
+            
+            # Text search doesn't need the embedding, so start it on its own connection now
+            # unless both searches are configured to share a single statement
+            single_statement = not lexical and self.search_config.get('single_statement_search', False)
+            if not single_statement:
+                text_future = _executor.submit(self._pooled_text_search, enhanced_query, config_top_k, no_cache)
+            
+            merged_results = None
+            if lexical:
+                query_embedding = None
+                vector_results = []
+            else:
+                # Near-duplicate queries reuse a previous response
+                query_embedding = self.get_query_embedding(enhanced_query, no_cache=no_cache)
+                cached_response = None if no_cache else self._lookup_similar_response(
+                    query_embedding, response_model, top_k, use_query_cache
+                )
+                if cached_response is not None:
+                    logger.info("Semantic cache hit, returning cached response")
+                    return cached_response.model_copy(update={"query": query_text})
                 
-                vector_results = self.vector_search(db, self.get_query_embedding(enhanced_query), limit=config_top_k)
+                # Release the connection before waiting on the text search so
+                # concurrent queries can never exhaust the pool while holding a slot
+                with get_pool().acquire() as db:
+                    if single_statement:
+                        # Let SingleStore fuse and rank both searches; only top_k rows come back
+                        merged_results = self.fused_search(
+                            db, query_embedding, enhanced_query, limit=config_top_k, top_k=top_k
+                        )
+                    else:
+                        vector_results = self.vector_search(db, query_embedding, limit=config_top_k, no_cache=no_cache)
+            
+            if merged_results is None:
                 logger.info(f"Vector search returned {len(vector_results)} results")
                 
-                text_results = self.text_search(db, enhanced_query, limit=config_top_k)
+                text_results = text_future.result()
                 logger.info(f"Text search returned {len(text_results)} results")
                 
-                # Merge results
-                merged_results = self.merge_search_results(vector_results, text_results)
+                # Merge results (text scores carry the full weight for lexical queries)
+                merged_results = self.merge_search_results(
+                    vector_results, text_results, vector_weight=0.0 if lexical else None, top_k=top_k
+                )
                 logger.info(f"After merging: {len(merged_results)} results")
+            
+            # Results are sorted by combined score and already limited to top_k,
+            # so enrichment below never touches more than top_k docs
+            logger.info(f"After limiting to top_k: {len(merged_results)} results")
+            self.save_debug_output("merged_results", lambda: {"query": query_text, "results": merged_results})
+            
+            # Skip the LLM call when retrieval found nothing relevant enough
+            best_score = merged_results[0]["combined_score"] if merged_results else 0.0
+            min_confidence = self.response_config.get('min_confidence', 0.2)
+            should_generate = best_score >= min_confidence
+            
+            response_future = None
+            with get_pool().acquire() as db:
+                # Searches return ids and scores only; read chunk text for the final top_k
+                self._fetch_content(db, merged_results)
                 
-                # Sort by combined score and limit to top_k
-                merged_results.sort(key=lambda x: x['combined_score'], reverse=True)
-                merged_results = merged_results[:top_k]
-                logger.info(f"After limiting to top_k: {len(merged_results)} results")
-                
-                # Build context with SearchResult objects
-                formatted_results = []
-                for doc in merged_results:
-                    # Get entities for this content
-                    entities = self.get_entities_for_content(db, doc["content"])
-                    logger.info(f"Found {len(entities)} entities for doc {doc['doc_id']}")
-                    
-                    # Get relationships for these entities
-                    relationships = self.get_relationships(db, [e.id for e in entities])
-                    logger.info(f"Found {len(relationships)} relationships for doc {doc['doc_id']}")
-                    
-                    # Create SearchResult object
-                    search_result = SearchResult(
-                        doc_id=doc["doc_id"],
-                        content=doc["content"],
-                        vector_score=doc.get("vector_score", 0.0),
-                        text_score=doc.get("text_score", 0.0),
-                        combined_score=doc["combined_score"],
-                        entities=entities,
-                        relationships=relationships
+                # Optionally generate from document text alone while entities are looked up
+                if should_generate and on_token is None and self.response_config.get('overlap_entity_lookup', False):
+                    response_future = _executor.submit(
+                        self.generate_response, query_text, {"results": [doc["content"] for doc in merged_results]},
+                        None, no_cache
                     )
-                    formatted_results.append(search_result)
                 
-                # Create SearchResponse
-                response = SearchResponse(
-                    query=query_text,
-                    results=formatted_results,
-                    generated_response=self.generate_response(query_text, {"results": formatted_results}),
-                    execution_time=0.0  # We'll set this in the API layer
-                )
+                # Look up entities and relationships for all docs in a fixed number of round-trips
+                try:
+                    enrichment = self._batch_get_entities_and_relationships(db, merged_results)
+                except Exception as e:
+                    # Per-doc lookups would hit the same failure top_k times; answer from the documents alone
+                    logger.error(f"Batched entity lookup failed, continuing without entities: {str(e)}", exc_info=True)
+                    enrichment = [([], []) for _ in merged_results]
+            
+            # Build context with SearchResult objects; these are assembled from trusted
+            # rows, so validation is left to the API layer's response model
+            formatted_results = []
+            for doc, (entities, relationships) in zip(merged_results, enrichment):
+                logger.info(f"Found {len(entities)} entities and {len(relationships)} relationships for doc {doc['doc_id']}")
                 
-                logger.info(f"Final response has {len(response.results)} results")
-                return response
+                # Create SearchResult object
+                search_result = SearchResult.model_construct(
+                    doc_id=doc["doc_id"],
+                    content=doc["content"],
+                    vector_score=doc.get("vector_score", 0.0),
+                    text_score=doc.get("text_score", 0.0),
+                    combined_score=doc["combined_score"],
+                    entities=entities,
+                    relationships=relationships
+                )
+                formatted_results.append(search_result)
+            
+            if on_results is not None:
+                on_results(formatted_results)
+            
+            if not should_generate:
+                logger.info(f"Top combined score {best_score:.3f} below min_confidence {min_confidence}, skipping response generation")
+                generated_response = NO_RESULTS_RESPONSE
+            elif response_future is not None:
+                generated_response = response_future.result()
+            else:
+                generated_response = self.generate_response(
+                    query_text, {"results": formatted_results}, on_token=on_token, no_cache=no_cache
+                )
+            
+            # Create SearchResponse
+            response = SearchResponse.model_construct(
+                query=query_text,
+                results=formatted_results,
+                generated_response=generated_response,
+                execution_time=0.0  # We'll set this in the API layer
+            )
+            
+            logger.info(f"Final response has {len(response.results)} results")
+            self.save_debug_output("response", lambda: response.model_dump(by_alias=True))
+            if generated_response != NO_RESULTS_RESPONSE and not no_cache:
+                if query_embedding is not None:
+                    _response_cache.add(query_embedding, response, key=(response_model, top_k))
+                if use_query_cache:
+                    _executor.submit(
+                        self._store_cached_response, cache_key, response_model, top_k, query_embedding, response
+                    )
+            return response
                 
+        except _StreamCancelled:
+            raise
         except Exception as e:
             logger.error(f"Query execution error: {str(e)}", exc_info=True)
             raise  # Let the API layer handle the error
 
-    def _build_prompt(self, query: str, context: Dict) -> str:
-        """Build prompt for the LLM using retrieved context."""
-        PROMPT_PATH = os.path.join(os.path.dirname(__file__), 'prompts', 'rag.md')
-        with open(PROMPT_PATH, 'r') as f:
-            RAG_PROMPT_TEMPLATE = f.read()
-        return config.get_response_prompt(query, context, RAG_PROMPT_TEMPLATE)
+    def stream_query(self, query_text: str, top_k: int = 5) -> Iterator[Dict[str, Any]]:
+        """
+        Run a query and yield its progress as events.
+        
+        Yields, in order: one {"type": "results"} event with the search results,
+        {"type": "token"} events with response text as it is generated, and a final
+        {"type": "done"} event. Cached responses and canned no-results answers
+        arrive as a single token event.
+        """
+        events: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue()
+        outcome: Dict[str, Any] = {}
+        # Set when the consumer stops iterating (e.g. the client disconnected)
+        cancelled = threading.Event()
+        
+        def send_results(results: List[SearchResult]) -> None:
+            if cancelled.is_set():
+                raise _StreamCancelled()
+            outcome['results_sent'] = True
+            events.put({"type": "results", "results": [r.model_dump(by_alias=True) for r in results]})
         
-    def generate_response(self, query: str, context: Dict[str, Any]) -> str:
-        """Generate a response using the language model."""
+        def send_token(text: str) -> None:
+            # Raising here aborts the LLM stream so nobody pays for unread tokens
+            if cancelled.is_set():
+                raise _StreamCancelled()
+            outcome['tokens_sent'] = True
+            events.put({"type": "token", "content": text})
+        
+        def run() -> None:
+            # query() waits on _executor tasks, so it gets its own thread
+            try:
+                outcome['response'] = self.query(query_text, top_k, on_results=send_results, on_token=send_token)
+            except _StreamCancelled:
+                logger.info("Stream consumer went away, stopped generating")
+            except Exception as e:
+                outcome['error'] = e
+            finally:
+                events.put(None)
+        
+        threading.Thread(target=run, name="rag-stream", daemon=True).start()
+        try:
+            while (event := events.get()) is not None:
+                yield event
+        finally:
+            cancelled.set()
+        
+        if 'error' in outcome:
+            raise outcome['error']
+        response: SearchResponse = outcome['response']
+        if not outcome.get('results_sent'):
+            yield {"type": "results", "results": [r.model_dump(by_alias=True) for r in response.results]}
+        if not outcome.get('tokens_sent'):
+            yield {"type": "token", "content": response.generated_response}
+        yield {"type": "done"}
+
+    async def aquery(self, query_text: str, top_k: int = 5) -> SearchResponse:
+        """
+        Async wrapper around query() for use from the event loop.
+        
+        query() already overlaps the embedding call, vector search and text search
+        on worker threads, so this only moves the blocking call off the loop. It uses
+        asyncio's default executor, not the search executor, because query() waits
+        on tasks it submits there.
+        """
+        return await asyncio.to_thread(self.query, query_text, top_k)
+
+    def _is_lexical_query(self, query_text: str) -> bool:
+        """
+        Whether a query is a quoted phrase or a short name lookup that full-text search handles alone.
+        
+        Short queries only count as names when every word carries a capital
+        letter or a digit ("SingleStore", "GPT-4o", "ISO 9001") and the first
+        word is not a question or instruction word, so "what is rag" or
+        "explain vector indexing" still get expansion and vector search.
+        """
+        max_tokens = self.search_config.get('lexical_max_tokens', 3)
+        if max_tokens <= 0:
+            return False
+        stripped = query_text.strip()
+        if len(stripped) > 1 and stripped[0] == '"' and stripped[-1] == '"' and stripped.count('"') == 2:
+            return True
+        tokens = stripped.split()
+        if not tokens or len(tokens) > max_tokens or '?' in stripped:
+            return False
+        if tokens[0].lower() in _QUESTION_WORDS:
+            return False
+        return all(any(c.isupper() or c.isdigit() for c in token) for token in tokens)
+
+    def _lookup_similar_response(self, query_embedding: List[float], model: str, top_k: int,
+                                 use_query_cache: bool) -> Optional[SearchResponse]:
+        """Find a cached response for a near-duplicate query, in process first and then in Query_Cache."""
+        cached_response = _response_cache.lookup(query_embedding, key=(model, top_k))
+        if cached_response is None and use_query_cache:
+            tau = self.search_config.get('semantic_cache_tau', 0.97)
+            cached_response = self._load_cached_response(
+                lambda db, version: _query_cache.get_similar(db, query_embedding, model, top_k, tau, version)
+            )
+            if cached_response is not None:
+                _response_cache.add(query_embedding, cached_response, key=(model, top_k))
+        return cached_response
+
+    def _load_cached_response(
+            self,
+            lookup: Callable[[DatabaseConnection, str], Optional[str]]
+        ) -> Optional[SearchResponse]:
+        """Run a Query_Cache lookup for the current corpus version on a pooled connection and decode a hit."""
+        try:
+            with get_pool().acquire() as db:
+                version = self._corpus_version_tag(db)
+                cached_json = None if version is None else lookup(db, version)
+            if cached_json is None:
+                return None
+            return SearchResponse.model_validate_json(cached_json)
+        except Exception as e:
+            logger.warning(f"Query cache lookup failed: {str(e)}")
+            return None
+
+    def _store_cached_response(self, cache_key: bytes, model: str, top_k: int,
+                               query_embedding: Optional[List[float]], response: SearchResponse) -> None:
+        """Write a response to Query_Cache and evict stale entries at most once an hour."""
+        global _query_cache_evicted_at
+        try:
+            with get_pool().acquire() as db:
+                version = self._corpus_version_tag(db)
+                if version is None:
+                    return
+                _query_cache.put(db, cache_key, model, top_k, query_embedding,
+                                 response.model_dump_json(by_alias=True), version)
+                if time.time() - _query_cache_evicted_at > 3600:
+                    _query_cache_evicted_at = time.time()
+                    _query_cache.evict(db)
+        except Exception as e:
+            logger.warning(f"Failed to write query cache: {str(e)}")
+
+    def reload_prompt(self) -> str:
+        """Re-read prompts/rag_prompt.md (e.g. while iterating on it) and return the template."""
+        global _prompt_template
+        with open(_PROMPT_PATH, 'r') as f:
+            template = f.read()
+        with _cache_lock:
+            _prompt_template = template
+        return template
+
+    def _build_prompt(self, query: str, context: Dict[str, Any]) -> str:
+        """Render the RAG prompt template with the query and retrieved context."""
+        template = _prompt_template if _prompt_template is not None else self.reload_prompt()
+        return template.format(query=query, **self._build_context_sections(context.get("results", [])))
+        
+    def _build_context_sections(self, results: List[Any]) -> Dict[str, str]:
+        """
+        Format search results into the documents, entities and relationships prompt sections.
+        
+        Entities are deduplicated by id and relationships by (source, target, type);
+        dicts keep first-seen order so the prompt is stable across runs.
+        
+        Args:
+            results: SearchResult objects, or plain document strings
+            
+        Returns:
+            Dict with 'documents', 'entities' and 'relationships' text
+        """
+        documents = []
+        entities: Dict[int, Entity] = {}
+        relationships: Dict[Tuple[int, int, str], Relationship] = {}
+        for i, result in enumerate(results, 1):
+            if isinstance(result, str):
+                documents.append(f"[{i}] {result}")
+                continue
+            documents.append(f"[{i}] {result.content}")
+            for entity in result.entities:
+                entities.setdefault(entity.id, entity)
+            for rel in result.relationships:
+                relationships.setdefault((rel.source_entity_id, rel.target_entity_id, rel.relation_type), rel)
+        
+        def entity_name(entity_id: int) -> str:
+            entity = entities.get(entity_id)
+            return entity.name if entity else f"entity #{entity_id}"
+        
+        entity_lines = [
+            f"- {e.name} ({e.category})" + (f": {e.description}" if e.description else "")
+            for e in entities.values()
+        ]
+        relationship_lines = [
+            f"- {entity_name(source)} -[{relation_type}]-> {entity_name(target)}"
+            for source, target, relation_type in relationships
+        ]
+        return {
+            "documents": "\n\n".join(documents) or "None",
+            "entities": "\n".join(entity_lines) or "None",
+            "relationships": "\n".join(relationship_lines) or "None"
+        }
+
+    def generate_response(
+        self,
+        query: str,
+        context: Dict[str, Any],
+        on_token: Optional[Callable[[str], None]] = None,
+        no_cache: bool = False
+    ) -> str:
+        """
+        Generate a response using the language model.
+        
+        Args:
+            query: User query
+            context: Dict with the 'results' to answer from
+            on_token: If given, the completion is streamed and each text delta passed here
+            no_cache: If True, the LLM response cache is neither read nor written
+            
+        Returns:
+            Full response text
+        """
         try:
             # Get model configuration
             model = self.response_config.get('model', 'gpt-4o')
@@ -432,78 +1439,157 @@ class RAGQueryEngine:
                     logger.warning(f"Model {model} not supported by Groq, falling back to mixtral-8x7b-32768")
                     model = 'mixtral-8x7b-32768'
             
-            response = self.response_client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "system", "content": "You are a helpful assistant that answers questions based on the provided context."},
-                    {"role": "user", "content": f"Query: {query}\n\nContext: {context}"}
-                ],
-                max_tokens=max_tokens,
-                temperature=temperature
-            )
-            return response.choices[0].message.content
+            messages = [
+                {"role": "system", "content": "You are a helpful assistant that answers questions based on the provided context."},
+                {"role": "user", "content": self._build_prompt(query, context)}
+            ]
+            
+            # Identical prompts (same query and retrieved context) reuse the earlier answer
+            cache_key = hashlib.sha256(
+                orjson.dumps([model, max_tokens, temperature, messages])
+            ).digest()
+            cached = None
+            if not no_cache:
+                with _cache_lock:
+                    cached = _llm_cache.get(cache_key)
+                    _llm_cache_stats['hits' if cached is not None else 'misses'] += 1
+            if cached is not None:
+                logger.info("LLM response cache hit")
+                if on_token is not None:
+                    on_token(cached)
+                return cached
+            
+            if on_token is None:
+                response = self.response_client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    max_tokens=max_tokens,
+                    temperature=temperature
+                )
+                generated = response.choices[0].message.content
+            else:
+                # Closing the stream (also when on_token raises) stops generation upstream
+                with self.response_client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    max_tokens=max_tokens,
+                    temperature=temperature,
+                    stream=True
+                ) as stream:
+                    parts = []
+                    for chunk in stream:
+                        delta = chunk.choices[0].delta.content if chunk.choices else None
+                        if delta:
+                            parts.append(delta)
+                            on_token(delta)
+                generated = ''.join(parts)
+            if not no_cache:
+                with _cache_lock:
+                    _llm_cache[cache_key] = generated
+            return generated
+        except _StreamCancelled:
+            raise
         except Exception as e:
             logger.error(f"Error generating response: {str(e)}")
             raise
 
+    def _extract_terms(self, content: str) -> FrozenSet[str]:
+        """Extract candidate entity names (lowercased words longer than 2 chars) from content."""
+        return _content_terms(content)
+
+    def _get_entity_vocab(self, db: DatabaseConnection) -> Optional[FrozenSet[str]]:
+        """
+        Get the lowercased names of all known entities, refreshed every entity_vocab_ttl seconds.
+        
+        Returns:
+            Entity name vocabulary, or None if it could not be loaded
+        """
+        global _entity_vocab, _entity_vocab_loaded_at
+        ttl = self.search_config.get('entity_vocab_ttl', 300)
+        with _cache_lock:
+            if _entity_vocab is not None and time.time() - _entity_vocab_loaded_at < ttl:
+                return _entity_vocab
+        
+        try:
+            rows = db.execute_query("SELECT DISTINCT LOWER(name) FROM Entities")
+            vocab = frozenset(r[0] for r in rows if r[0])
+        except Exception as e:
+            logger.warning(f"Failed to load entity vocabulary: {str(e)}")
+            return None
+        
+        with _cache_lock:
+            _entity_vocab = vocab
+            _entity_vocab_loaded_at = time.time()
+        logger.info(f"Loaded entity vocabulary with {len(vocab)} names")
+        return vocab
+
+    def _match_entity_terms(self, db: DatabaseConnection, terms: FrozenSet[str]) -> FrozenSet[str]:
+        """Narrow candidate terms to known entity names so only real hits reach SQL."""
+        vocab = self._get_entity_vocab(db)
+        return terms & vocab if vocab is not None else terms
+
+    def _row_to_entity(self, r: Tuple) -> Optional[Entity]:
+        """
+        Build an Entity from an (entity_id, name, category, description) row.
+        
+        Aliases are not selected: neither the LLM context nor the UI uses them,
+        so search results leave Entity.aliases at its empty default. The model
+        is built without validation, so the checks Entity would apply are made
+        here; otherwise responses carrying a bad row fail to load back from
+        Query_Cache. Rows with a name or category Entity rejects are skipped
+        (None), as validation used to drop them; descriptions it rejects (ingest
+        stores '' when the LLM gives none) are mapped to None.
+        """
+        if not r[1] or len(r[1]) > 255 or r[2] not in _ENTITY_CATEGORIES:
+            logger.debug(f"Skipping entity row {r[0]} that does not fit the Entity model")
+            return None
+        description = r[3]
+        if description is not None and len(description.strip()) < 10:
+            description = None
+        return Entity.model_construct(
+            entity_id=r[0],  # Use entity_id to match the Field alias
+            name=r[1],
+            category=r[2],
+            description=description[:2000] if description else description
+        )
+
+    def _row_to_relationship(self, r: Tuple) -> Relationship:
+        """Build a Relationship from a (source, target, relation_type, doc_id) row (unvalidated)."""
+        return Relationship.model_construct(
+            source_entity_id=r[0],
+            target_entity_id=r[1],
+            relation_type=r[2] or "",
+            metadata={"doc_id": r[3]} if r[3] else {}
+        )
+
     def get_entities_for_content(self, db: DatabaseConnection, content: str) -> List[Entity]:
         """Find entities mentioned in the content."""
         try:
             # Extract potential entity names using simple word-based approach
-            # Remove special characters and split into words
-            words = re.sub(r'[^\w\s]', ' ', content).split()
-            # Get unique words, filter out common words and very short terms
-            unique_terms = set(word.lower() for word in words if len(word) > 2)
-            
-            # Format terms for SQL query
-            terms_str = ', '.join(f"'{term}'" for term in unique_terms)
+            unique_terms = self._match_entity_terms(db, self._extract_terms(content))
             
-            if not terms_str:
+            if not unique_terms:
                 return []
             
+            # Bind terms as parameters so the plan is reusable and input is escaped
+            placeholders, params = _in_list(unique_terms)
+            
             # Query using schema-defined columns
-            sql = """
+            sql = f"""
                 SELECT DISTINCT
                     entity_id,
                     name,
                     category,
-                    COALESCE(description, '') as description,
-                    COALESCE(aliases, '[]') as aliases
+                    description
                 FROM Entities
-                WHERE LOWER(name) IN (%s)
+                WHERE name IN ({placeholders})
                 LIMIT 10;
-            """ % terms_str
-            
-            logger.debug(f"Executing entity search SQL: {sql}")
-            results = db.execute_query(sql)
+            """
             
-            entities = []
-            for r in results:
-                try:
-                    # Parse the JSON string into a Python list
-                    aliases = json.loads(r[4]) if r[4] else []
-                    
-                    entity = Entity(
-                        entity_id=r[0],  # Use entity_id to match the Field alias
-                        name=r[1],
-                        category=r[2],
-                        description=r[3],
-                        aliases=aliases
-                    )
-                    entities.append(entity)
-                except json.JSONDecodeError as e:
-                    logger.warning(f"Failed to parse aliases JSON for entity {r[0]}: {e}")
-                    # Continue with empty aliases if JSON parsing fails
-                    entity = Entity(
-                        entity_id=r[0],  # Use entity_id to match the Field alias
-                        name=r[1],
-                        category=r[2],
-                        description=r[3],
-                        aliases=[]
-                    )
-                    entities.append(entity)
+            logger.debug(f"Executing entity search SQL with {len(unique_terms)} terms")
+            results = db.execute_query(sql, params)
             
-            return entities
+            return [entity for entity in map(self._row_to_entity, results) if entity is not None]
             
         except Exception as e:
             logger.error(f"Error finding entities: {str(e)}", exc_info=True)
@@ -515,62 +1601,186 @@ class RAGQueryEngine:
             if not entity_ids:
                 return []
             
-            # Format entity IDs for SQL
-            ids_str = ', '.join(str(id) for id in entity_ids)
+            # Bind entity IDs as parameters, once for each IN list
+            placeholders, ids = _in_list(entity_ids)
             
-            # Query using schema-defined columns
-            sql = """
-                SELECT DISTINCT
-                    source_entity_id,
-                    target_entity_id,
-                    relation_type,
-                    doc_id
-                FROM Relationships
-                WHERE source_entity_id IN (%s)
-                OR target_entity_id IN (%s)
-                LIMIT 20;
-            """ % (ids_str, ids_str)
-            
-            results = db.execute_query(sql)
-            
-            return [
-                Relationship(
-                    source_entity_id=r[0],
-                    target_entity_id=r[1],
-                    relation_type=r[2],
-                    metadata={"doc_id": r[3]} if r[3] else {}
-                )
-                for r in results
-            ]
+            results = db.execute_query(_relationship_sql(placeholders), ids + ids + (20,))
+            
+            return [self._row_to_relationship(r) for r in results]
             
         except Exception as e:
             logger.error(f"Error getting relationships: {str(e)}", exc_info=True)
             return []
 
-    def save_debug_output(self, stage: str, data: Dict) -> None:
-        """Save intermediate results for debugging."""
-        if not self.debug_output:
-            return
+    def _fetch_content(self, db: DatabaseConnection, docs: List[Dict]) -> None:
+        """
+        Fill in each doc's 'content' from Document_Embeddings by embedding_id.
+        
+        vector_search, text_search and fused_search leave chunk text out of their
+        rows, so it is read once here for the handful of docs that survive merging
+        rather than for every candidate.
+        """
+        missing = {doc["embedding_id"] for doc in docs if doc.get("embedding_id") is not None and "content" not in doc}
+        contents: Dict[int, str] = {}
+        if missing:
+            placeholders, ids = _in_list(missing)
+            contents = dict(db.execute_query(
+                f"SELECT embedding_id, content FROM Document_Embeddings WHERE embedding_id IN ({placeholders})",
+                ids
+            ))
+        for doc in docs:
+            doc.setdefault("content", contents.get(doc.get("embedding_id")) or "")
+
+    def _batch_get_entities_and_relationships(
+            self,
+            db: DatabaseConnection,
+            docs: List[Dict],
+            max_entities: int = 10,
+            max_relationships: int = 20
+        ) -> List[Tuple[List[Entity], List[Relationship]]]:
+        """
+        Look up entities and relationships for all docs with one query each.
+        
+        Chunks ingested with an entity mapping get their entities from
+        Chunk_Entities by embedding_id; the rest fall back to matching their
+        terms against entity names. Applies the same per-doc limits as
+        get_entities_for_content and get_relationships.
+        
+        Args:
+            docs: Merged search results with a 'content' field and, when known, an 'embedding_id'
+            max_entities: Maximum entities attached to each doc
+            max_relationships: Maximum relationships attached to each doc
             
-        try:
-            filename = f"rag_query_{stage}_{int(time.time())}.json"
-            filepath = os.path.join(self.debug_dir, filename)
+        Returns:
+            (entities, relationships) for each doc, in the same order as docs
+        """
+        doc_entities: List[List[Entity]] = [[] for _ in docs]
+        
+        # Entities recorded for each chunk at ingest time
+        chunk_to_docs: Dict[int, List[int]] = {}
+        for i, doc in enumerate(docs):
+            if doc.get("embedding_id") is not None:
+                chunk_to_docs.setdefault(doc["embedding_id"], []).append(i)
+        if chunk_to_docs:
+            placeholders, chunk_ids = _in_list(chunk_to_docs)
+            chunk_sql = f"""
+                SELECT
+                    ce.embedding_id,
+                    e.entity_id,
+                    e.name,
+                    e.category,
+                    e.description
+                FROM Chunk_Entities ce
+                JOIN Entities e ON e.entity_id = ce.entity_id
+                WHERE ce.embedding_id IN ({placeholders});
+            """
+            try:
+                chunk_rows = db.execute_query(chunk_sql, chunk_ids)
+            except Exception as e:
+                # e.g. a database created before Chunk_Entities; every doc uses the heuristic
+                logger.warning(f"Chunk entity lookup failed, matching terms instead: {str(e)}")
+                chunk_rows = []
+            for r in chunk_rows:
+                entity = self._row_to_entity(r[1:])
+                if entity is None:
+                    continue
+                for i in chunk_to_docs[r[0]]:
+                    if len(doc_entities[i]) < max_entities:
+                        doc_entities[i].append(entity)
+        
+        # Chunks without a mapping (ingested before Chunk_Entities, or not carrying an
+        # embedding_id) fall back to the term heuristic
+        unmapped = [i for i, matched in enumerate(doc_entities) if not matched]
+        doc_terms = {i: self._extract_terms(docs[i]["content"]) for i in unmapped}
+        all_terms = self._match_entity_terms(db, frozenset().union(*doc_terms.values())) if doc_terms else frozenset()
+        if all_terms:
+            # One entity query for the union of candidate terms across the unmapped docs
+            placeholders, term_params = _in_list(all_terms)
+            entity_sql = f"""
+                SELECT DISTINCT
+                    entity_id,
+                    name,
+                    category,
+                    description
+                FROM Entities
+                WHERE name IN ({placeholders});
+            """
+            entity_rows = db.execute_query(entity_sql, term_params)
             
-            with open(filepath, 'w') as f:
-                json.dump(data, f, indent=2)
-                
-            logger.debug(f"Debug output for {stage} saved to {filepath}")
+            # Scatter entities back to the docs that mention them via a term -> docs index
+            term_to_docs: Dict[str, List[int]] = {}
+            for i, terms in doc_terms.items():
+                for term in terms & all_terms:
+                    term_to_docs.setdefault(term, []).append(i)
             
-        except Exception as e:
-            logger.warning(f"Failed to save debug output: {str(e)}")
+            for r in entity_rows:
+                entity = self._row_to_entity(r)
+                if entity is None:
+                    continue
+                for i in term_to_docs.get(r[1].lower(), ()):
+                    if len(doc_entities[i]) < max_entities:
+                        doc_entities[i].append(entity)
+        
+        all_entity_ids = {e.id for matched in doc_entities for e in matched}
+        if not all_entity_ids:
+            return [(matched, []) for matched in doc_entities]
+        
+        # One relationship query for the union of matched entity ids
+        placeholders, ids = _in_list(all_entity_ids)
+        relationship_rows = db.execute_query(
+            _relationship_sql(placeholders), ids + ids + (max_relationships * len(docs),)
+        )
+        
+        # Bucket relationships by the entities each doc matched via an entity id -> docs index
+        entity_to_docs: Dict[int, List[int]] = {}
+        for i, matched in enumerate(doc_entities):
+            for e in matched:
+                entity_to_docs.setdefault(e.id, []).append(i)
+        
+        doc_relationships: List[List[Relationship]] = [[] for _ in docs]
+        for r in relationship_rows:
+            rel = self._row_to_relationship(r)
+            targets = set(entity_to_docs.get(rel.source_entity_id, ()))
+            targets.update(entity_to_docs.get(rel.target_entity_id, ()))
+            for i in targets:
+                if len(doc_relationships[i]) < max_relationships:
+                    doc_relationships[i].append(rel)
+        
+        return list(zip(doc_entities, doc_relationships))
+
+    def save_debug_output(self, stage: str, data_fn: Callable[[], Dict]) -> None:
+        """
+        Queue intermediate results for the background debug writer.
+        
+        Args:
+            stage: Name of the pipeline stage, used in the output filename
+            data_fn: Builds the data to write; only called when debug output is enabled
+        """
+        global _debug_writer_thread
+        if not self.debug_output:
+            return
+        
+        with _cache_lock:
+            if _debug_writer_thread is None:
+                _debug_writer_thread = threading.Thread(
+                    target=_debug_writer, args=(self.debug_dir,), name="rag-debug-writer", daemon=True
+                )
+                _debug_writer_thread.start()
+        
+        try:
+            _debug_queue.put_nowait((stage, data_fn()))
+        except queue.Full:
+            logger.debug(f"Debug queue full, dropping {stage} output")
 
     def hybrid_search(self, db: DatabaseConnection, query: str, top_k: int = 5) -> List[Dict]:
         # Add early exit conditions
         vector_results = self.vector_search(db, self.get_query_embedding(query), limit=top_k*3)
         if len(vector_results) >= top_k and \
            vector_results[0]['score'] > 0.9:  # High confidence match
-            return vector_results[:top_k]
-        
-        # Otherwise proceed with hybrid
-        text_results = self.text_search(db, query, limit=top_k*2)
-        return self.merge_search_results(vector_results, text_results)
+            results = [dict(r) for r in vector_results[:top_k]]
+        else:
+            # Otherwise proceed with hybrid
+            text_results = self.text_search(db, query, limit=top_k*2)
+            results = self.merge_search_results(vector_results, text_results)
+        self._fetch_content(db, results)
+        return results
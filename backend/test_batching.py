@@ -0,0 +1,87 @@
+import threading
+from concurrent.futures import TimeoutError
+
+import pytest
+
+from search.batching import EmbeddingBatcher
+
+
+def fake_embedding(text):
+    return [float(len(text))]
+
+
+class StubEmbedder:
+    """Records each call; optionally blocks until released or fails on given texts."""
+
+    def __init__(self, fail_on=(), block=False):
+        self.calls = []
+        self.fail_on = set(fail_on)
+        self.started = threading.Event()
+        self.release = threading.Event()
+        if not block:
+            self.release.set()
+
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        self.started.set()
+        self.release.wait(5)
+        if self.fail_on & set(texts):
+            raise RuntimeError("bad input")
+        return [fake_embedding(text) for text in texts]
+
+
+def test_concurrent_texts_are_coalesced():
+    stub = StubEmbedder(block=True)
+    batcher = EmbeddingBatcher(stub)
+    first = batcher.submit("a")
+    assert stub.started.wait(5)
+    # Queued while the first call is in flight, so both go out in the next call
+    rest = [batcher.submit("bb"), batcher.submit("ccc")]
+    stub.release.set()
+    assert first.result(5) == [1.0]
+    assert [f.result(5) for f in rest] == [[2.0], [3.0]]
+    assert stub.calls == [["a"], ["bb", "ccc"]]
+
+
+def test_failed_batch_is_retried_per_text():
+    stub = StubEmbedder(fail_on={"bad"})
+    batcher = EmbeddingBatcher(stub, max_delay=0.2)
+    futures = {text: batcher.submit(text) for text in ["ok", "bad", "fine"]}
+    assert futures["ok"].result(5) == [2.0]
+    assert futures["fine"].result(5) == [4.0]
+    with pytest.raises(RuntimeError):
+        futures["bad"].result(5)
+    assert stub.calls == [["ok", "bad", "fine"], ["ok"], ["bad"], ["fine"]]
+
+
+def test_embed_times_out():
+    stub = StubEmbedder(block=True)
+    batcher = EmbeddingBatcher(stub, timeout=0.1)
+    try:
+        with pytest.raises(TimeoutError):
+            batcher.embed(["slow"])
+    finally:
+        stub.release.set()
+
+
+def test_worker_survives_failures():
+    batcher = EmbeddingBatcher(lambda texts: [], timeout=5)
+    with pytest.raises(ValueError):
+        batcher.embed(["a"])
+
+    # A failure outside embed_fn still resolves the batch and keeps the worker running
+    batcher.embed_fn = lambda texts: [fake_embedding(text) for text in texts]
+    original = batcher._resolve
+    calls = []
+
+    def resolve_once(batch):
+        calls.append(batch)
+        if len(calls) == 1:
+            raise KeyError("boom")
+        original(batch)
+
+    batcher._resolve = resolve_once
+    with pytest.raises(KeyError):
+        batcher.embed(["b"])
+    assert batcher.embed(["cc"]) == [[2.0]]
+    assert batcher._worker.is_alive()